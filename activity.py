@@ -0,0 +1,151 @@
+import bisect
+import json
+import os
+from datetime import datetime
+from storage import file_lock
+
+# Directory holding one '<YYYY-MM>.jsonl' activity file per month, each with a '.idx' time index
+ACTIVITY_DIR = os.environ.get('TRELLOMIZE_ACTIVITY_DIR', os.path.join(os.path.dirname(__file__), 'activity'))
+# A time index entry is added whenever this many bytes were appended since the previous one
+INDEX_STRIDE = 64 * 1024
+
+
+def month_path(timestamp, activity_dir=ACTIVITY_DIR):
+    return os.path.join(activity_dir, timestamp[:7] + '.jsonl')
+
+
+def index_path(file_path):
+    return file_path + '.idx'
+
+
+def _last_index_entry(file_path):
+    path = index_path(file_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        file.seek(max(0, file.tell() - 256))
+        lines = file.read().splitlines()
+    for line in reversed(lines):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+    return None
+
+
+def read_index(file_path):
+    """Return the (times, offsets) of the time index of an activity file."""
+    times = []
+    offsets = []
+    path = index_path(file_path)
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                times.append(entry['time'])
+                offsets.append(entry['offset'])
+    return times, offsets
+
+
+# Function to record one structured activity event
+def record_event(action, actor, project_id=None, task_id=None, activity_dir=ACTIVITY_DIR, **details):
+    """Append an event to this month's activity file and return it.
+
+    Events are written in time order under the file lock, and every
+    INDEX_STRIDE bytes the time and byte offset of an event go to the
+    sidecar index, which query_events uses to seek to the start of a range.
+    """
+    return record_events([make_event(action, actor, project_id, task_id, **details)], activity_dir)[0]
+
+
+def make_event(action, actor, project_id=None, task_id=None, **details):
+    event = {
+        'time': datetime.now().replace(microsecond=0).isoformat(),
+        'action': action,
+        'actor': actor,
+        'project_id': project_id,
+        'task_id': task_id,
+    }
+    if details:
+        event['details'] = details
+    return event
+
+
+# Function to record several events with one lock and one write per monthly file
+def record_events(events, activity_dir=ACTIVITY_DIR):
+    os.makedirs(activity_dir, exist_ok=True)
+    with file_lock(os.path.join(activity_dir, 'activity')):
+        start = 0
+        while start < len(events):
+            # Events of one month go to one file in a single write
+            month = events[start]['time'][:7]
+            end = start
+            while end < len(events) and events[end]['time'][:7] == month:
+                end += 1
+            file_path = month_path(events[start]['time'], activity_dir)
+            last = _last_index_entry(file_path)
+            indexed = []
+            lines = []
+            # newline='' so the offsets counted below match the bytes written
+            with open(file_path, 'a', newline='') as file:
+                offset = file.tell()
+                for event in events[start:end]:
+                    if last is None or offset - last['offset'] >= INDEX_STRIDE:
+                        last = {'time': event['time'], 'offset': offset}
+                        indexed.append(json.dumps(last) + '\n')
+                    line = json.dumps(event) + '\n'
+                    lines.append(line)
+                    offset += len(line.encode('utf-8'))
+                file.write(''.join(lines))
+            if indexed:
+                with open(index_path(file_path), 'a') as file:
+                    file.write(''.join(indexed))
+            start = end
+    return events
+
+
+# Function to find activity events by actor, project, action and time range
+def query_events(actor=None, project_id=None, action=None, since=None, until=None, activity_dir=ACTIVITY_DIR):
+    """Yield the matching events oldest first.
+
+    since and until are inclusive ISO timestamps (or prefixes such as a date).
+    Only the monthly files that overlap the range are opened, and each one is
+    read from the last indexed offset at or before since.
+    """
+    if not os.path.isdir(activity_dir):
+        return
+    months = sorted(name[:-len('.jsonl')] for name in os.listdir(activity_dir) if name.endswith('.jsonl'))
+    for month in months:
+        if since and month < since[:7]:
+            continue
+        if until and month > until[:7]:
+            break
+        file_path = os.path.join(activity_dir, month + '.jsonl')
+        offset = 0
+        if since:
+            times, offsets = read_index(file_path)
+            position = bisect.bisect_left(times, since)
+            if position > 0:
+                offset = offsets[position - 1]
+        with open(file_path, 'r') as file:
+            file.seek(offset)
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if since and event['time'] < since:
+                    continue
+                if until and event['time'][:len(until)] > until:
+                    return
+                if actor and event['actor'] != actor:
+                    continue
+                if project_id and event['project_id'] != project_id:
+                    continue
+                if action and event['action'] != action:
+                    continue
+                yield event
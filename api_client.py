@@ -0,0 +1,110 @@
+import http.client
+import json
+import os
+from urllib.parse import quote, urlencode, urlsplit
+
+# Address of the API server (e.g. http://127.0.0.1:8765); when set, operations are sent there
+SERVER_URL = os.environ.get('TRELLOMIZE_SERVER')
+# Session token sent with every request; set by login(), or given to cli.py through the environment
+TOKEN = os.environ.get('TRELLOMIZE_TOKEN')
+# Paths of the requests that start and end a session
+LOGIN_PATH = '/login'
+LOGOUT_PATH = '/logout'
+
+# Each command: (HTTP method, path, argument names in the order the operation takes them after the user).
+# Arguments named in the path are filled in there; the rest go in the query string for GET
+# and DELETE and in the JSON body otherwise.
+ROUTES = {
+    'list-projects': ('GET', '/projects', []),
+    'create-project': ('POST', '/projects', ['project']),
+    'show-project': ('GET', '/projects/{project}', ['project']),
+    'delete-project': ('DELETE', '/projects/{project}', ['project']),
+    'add-member': ('POST', '/projects/{project}/members', ['project', 'member']),
+    'remove-member': ('DELETE', '/projects/{project}/members/{member}', ['project', 'member']),
+    'assign-task': ('POST', '/projects/{project}/tasks', ['project', 'member', 'description', 'details']),
+    'update-description': ('PUT', '/projects/{project}/tasks/{task}/description', ['project', 'task', 'description']),
+    'update-details': ('PUT', '/projects/{project}/tasks/{task}/details', ['project', 'task', 'details']),
+    'set-priority': ('PUT', '/projects/{project}/tasks/{task}/priority', ['project', 'task', 'priority']),
+    'set-status': ('PUT', '/projects/{project}/tasks/{task}/status', ['project', 'task', 'status']),
+    'add-comment': ('POST', '/projects/{project}/tasks/{task}/comments', ['project', 'task', 'comment']),
+    'list-comments': ('GET', '/projects/{project}/tasks/{task}/comments', ['project', 'task', 'page']),
+    'edit-task': ('PATCH', '/projects/{project}/tasks/{task}', ['project', 'task', 'description', 'details', 'priority', 'status']),
+    'search': ('GET', '/search', ['query', 'limit']),
+    'my-tasks': ('GET', '/my-tasks', []),
+    'query-tasks': ('GET', '/tasks', ['assignee', 'priority', 'status', 'project', 'after', 'before', 'within']),
+    'list-archive': ('GET', '/archive', []),
+    'restore-project': ('POST', '/archive/{project}/restore', ['project']),
+}
+
+
+class ApiError(Exception):
+    """Raised when the server rejects a request; the message is the server's error text."""
+
+
+_connection = None
+
+
+def _connect():
+    global _connection
+    if _connection is None:
+        address = urlsplit(SERVER_URL)
+        _connection = http.client.HTTPConnection(address.hostname, address.port or 80, timeout=30)
+    return _connection
+
+
+def request(method, path, body=None):
+    """Send one request to the server over a kept-alive connection and return the decoded JSON."""
+    global _connection
+    payload = json.dumps(body).encode('utf-8') if body is not None else None
+    headers = {'Content-Type': 'application/json'} if payload is not None else {}
+    if TOKEN:
+        headers['Authorization'] = f"Bearer {TOKEN}"
+    for attempt in range(2):
+        connection = _connect()
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read() or b'null')
+            break
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            # The server may have closed an idle connection; reconnect once
+            connection.close()
+            _connection = None
+            if attempt:
+                raise ApiError(f"Cannot reach the server at {SERVER_URL}: {e}")
+        except OSError as e:
+            connection.close()
+            _connection = None
+            raise ApiError(f"Cannot reach the server at {SERVER_URL}: {e}")
+    if response.status >= 400:
+        raise ApiError(data.get('error', f"Server error {response.status}") if isinstance(data, dict) else f"Server error {response.status}")
+    return data['result']
+
+
+# Function to start a session on the server; later requests act as this user
+def login(username, password):
+    global TOKEN
+    TOKEN = request('POST', LOGIN_PATH, {'user': username, 'password': password})['token']
+    return TOKEN
+
+
+# Function to end the session on the server
+def logout():
+    global TOKEN
+    if TOKEN:
+        request('POST', LOGOUT_PATH, {})
+        TOKEN = None
+
+
+# Function to run a command on the server as the logged-in user
+def run(command, username, *values):
+    # The server takes the user from the session token; username is the same user on this side
+    method, path, names = ROUTES[command]
+    arguments = dict(zip(names, values))
+    for name in names:
+        if '{' + name + '}' in path:
+            path = path.replace('{' + name + '}', quote(str(arguments.pop(name)), safe=''))
+    if method in ('GET', 'DELETE'):
+        # Arguments left out are not sent, rather than sent as 'None'
+        return request(method, path + '?' + urlencode({name: value for name, value in arguments.items() if value is not None}))
+    return request(method, path, arguments)
@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from storage import file_lock
+from models import encode
+from comments import COMMENTS_DIR
+
+# Directory holding the gzip JSONL archive segments and their 'index.jsonl', and the comments of the
+# archived projects under 'comments/'; relative to the working directory, like the data files
+ARCHIVE_DIR = os.environ.get('TRELLOMIZE_ARCHIVE_DIR', 'archive')
+# A new segment is started once the current one reaches this many bytes
+SEGMENT_SIZE = 8 * 1024 * 1024
+INDEX_NAME = 'index.jsonl'
+
+
+def segment_path(name, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, name)
+
+
+def _current_segment(archive_dir):
+    names = sorted(name for name in os.listdir(archive_dir) if name.endswith('.jsonl.gz'))
+    if not names:
+        return '000001.jsonl.gz'
+    name = names[-1]
+    if os.path.getsize(segment_path(name, archive_dir)) >= SEGMENT_SIZE:
+        return f"{int(name.split('.')[0]) + 1:06d}.jsonl.gz"
+    return name
+
+
+# Index entries read so far, per archive directory: (bytes read, {project id: entry})
+_indexes = {}
+
+
+def read_index(archive_dir=ARCHIVE_DIR):
+    """Return {project id: index entry} for every project currently archived.
+
+    The index is append-only, so only the lines added since the previous call
+    are read. Entries are in the order the projects were archived.
+    """
+    path = os.path.join(archive_dir, INDEX_NAME)
+    # Keyed by the full path, so a relative archive_dir in another working directory is another archive
+    key = os.path.abspath(archive_dir)
+    size, entries = _indexes.get(key, (0, {}))
+    if not os.path.exists(path):
+        return {}
+    if os.path.getsize(path) < size:
+        # The archive was replaced; start over
+        size, entries = 0, {}
+    with open(path, 'rb') as file:
+        file.seek(size)
+        for line in file:
+            if not line.endswith(b'\n'):
+                # Half-written by another session; read it next time
+                break
+            size += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries.pop(entry['id'], None)
+            if not entry.get('restored'):
+                entries[entry['id']] = entry
+    _indexes[key] = (size, entries)
+    return entries
+
+
+def _move_comments(source, target):
+    # Move a project's comment directory, adding its files to target if that exists already
+    if not os.path.isdir(source):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if not os.path.exists(target):
+        os.replace(source, target)
+        return
+    for name in os.listdir(source):
+        os.replace(os.path.join(source, name), os.path.join(target, name))
+    os.rmdir(source)
+
+
+# Function to move a copy of a project into the archive
+def archive_project(project, reason, actor=None, archive_dir=ARCHIVE_DIR, comments_dir=COMMENTS_DIR):
+    """Append a project to the current segment and return its index entry.
+
+    Every project is written as its own gzip member, so a segment is an
+    ordinary gzip JSONL file and one project can be read back by
+    decompressing only its own bytes. The project's comment files move to
+    the archive's 'comments/' with it.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    with file_lock(os.path.join(archive_dir, 'archive')):
+        name = _current_segment(archive_dir)
+        member = gzip.compress((json.dumps(project, default=encode) + '\n').encode('utf-8'), mtime=0)
+        with open(segment_path(name, archive_dir), 'ab') as file:
+            offset = file.tell()
+            file.write(member)
+        entry = {
+            'id': project['id'],
+            'title': project.get('title'),
+            'leader': project.get('leader'),
+            'reason': reason,
+            'actor': actor,
+            'archived_at': datetime.now().replace(microsecond=0).isoformat(),
+            'segment': name,
+            'offset': offset,
+            'length': len(member),
+        }
+        with open(os.path.join(archive_dir, INDEX_NAME), 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+        _move_comments(os.path.join(comments_dir, project['id']), os.path.join(archive_dir, 'comments', project['id']))
+    return entry
+
+
+# Function to find archived projects by title and leader
+def find_archived(title=None, leader=None, archive_dir=ARCHIVE_DIR):
+    return [entry for entry in read_index(archive_dir).values()
+            if (title is None or entry['title'] == title) and (leader is None or entry['leader'] == leader)]
+
+
+# Function to read one archived project
+def load_archived(project_id, archive_dir=ARCHIVE_DIR):
+    entry = read_index(archive_dir).get(project_id)
+    if entry is None:
+        return None
+    with open(segment_path(entry['segment'], archive_dir), 'rb') as file:
+        file.seek(entry['offset'])
+        member = file.read(entry['length'])
+    return json.loads(gzip.decompress(member))
+
+
+# Function to take a restored project off the archive index
+def mark_restored(project_id, archive_dir=ARCHIVE_DIR, comments_dir=COMMENTS_DIR):
+    """Record that a project is live again and give it back its comments; its archived copy stays in its segment."""
+    with file_lock(os.path.join(archive_dir, 'archive')):
+        with open(os.path.join(archive_dir, INDEX_NAME), 'a') as file:
+            file.write(json.dumps({'id': project_id, 'restored': datetime.now().replace(microsecond=0).isoformat()}) + '\n')
+        _move_comments(os.path.join(archive_dir, 'comments', project_id), os.path.join(comments_dir, project_id))
@@ -6,6 +6,10 @@ from rich.console import Console
 from rich.table import Table
 from datetime import datetime, timedelta
 from loguru import logger
+import storage
+from user_index import find_user
+from session import start_session
+from passwords import hash_password, verify_password, needs_rehash
 
 # Initialize Rich console
 console = Console()
@@ -18,50 +22,55 @@ LOG_FILE = 'activity.log'
 
 # Function to load data from file
 def load_data(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as file:
-            return json.load(file)
-    return []
+    return storage.load_data(file_path)
 
 # Function to save data to file
 def save_data(data, file_path):
     try:
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        storage.save_data(data, file_path)
+        console.print(f"Data saved to {file_path}", style="bold green")
+    except Exception as e:
+        console.print(f"Error saving data to {file_path}: {e}", style="bold red")
+
+# Function to save a single record to file
+def save_record(record, file_path):
+    try:
+        storage.save_record(record, file_path)
         console.print(f"Data saved to {file_path}", style="bold green")
     except Exception as e:
         console.print(f"Error saving data to {file_path}: {e}", style="bold red")
 
 def create_account(username, password, email, is_manager):
-    users = load_data(DATA_FILE)
-    if any(user['username'] == username for user in users):
+    if find_user(username, DATA_FILE):
         console.print("This username is already taken.", style="bold red")
         return False
     user = {
         'id': str(uuid.uuid4()),
         'username': username,
-        'password': password,
+        'password': hash_password(password),
         'email': email,
         'role': 'manager' if is_manager else 'member',
         'active': True
     }
-    users.append(user)
-    save_data(users, DATA_FILE)
+    save_record(user, DATA_FILE)
     logger.info(f"User account created: {username}, Manager status: {'Yes' if is_manager else 'No'}")
     console.print("User account created successfully. Manager status: " + ("Yes" if is_manager else "No"), style="bold green")
     return True
 
 # Function to log in to a user account
 def login(username, password):
-    users = load_data(DATA_FILE)
-    for user in users:
-        if user['username'] == username and user['password'] == password:
-            if user['active']:
-                logger.info(f"User logged in: {username}")
-                console.print(f"Welcome back, {username}! You are logged in as {'a manager' if user['role'] == 'manager' else 'a member'}.", style="bold blue")
-                return user
-            else:
-                console.print("Your account is inactive. Please contact the system administrator.", style="bold red")
-                return None
+    user = find_user(username, DATA_FILE)
+    if user and verify_password(password, user['password']):
+        if user['active']:
+            if needs_rehash(user['password']):
+                # Replace a plain text password or outdated work factors now that the password is known
+                user = storage.update_record(storage.record_key(user), DATA_FILE, lambda user: user.update(password=hash_password(password)))
+            start_session(user)
+            logger.info(f"User logged in: {username}")
+            console.print(f"Welcome back, {username}! You are logged in as {'a manager' if user['role'] == 'manager' else 'a member'}.", style="bold blue")
+            return user
+        else:
+            console.print("Your account is inactive. Please contact the system administrator.", style="bold red")
+            return None
     console.print("Invalid username or password. Please try again or create a new account.", style="bold red")
     return None
\ No newline at end of file
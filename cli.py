@@ -0,0 +1,155 @@
+import argparse
+import json
+import sys
+import storage
+import operations
+from session import get_session_user
+from operations import OperationError
+from models import encode
+from log_export import start_exporter
+
+# Each command: (operation, argument names in the order the operation takes them after the user)
+COMMANDS = {
+    'create-project': (operations.create_project, ['project']),
+    'add-member': (operations.add_member, ['project', 'member']),
+    'remove-member': (operations.remove_member, ['project', 'member']),
+    'assign-task': (operations.assign_task, ['project', 'member', 'description', 'details']),
+    'delete-project': (operations.delete_project, ['project']),
+    'update-description': (operations.update_task_description, ['project', 'task', 'description']),
+    'update-details': (operations.update_task_details, ['project', 'task', 'details']),
+    'set-priority': (operations.change_task_priority, ['project', 'task', 'priority']),
+    'set-status': (operations.change_task_status, ['project', 'task', 'status']),
+    'add-comment': (operations.add_comment, ['project', 'task', 'comment']),
+    'list-comments': (operations.list_comments, ['project', 'task', 'page']),
+    'search': (operations.search_tasks, ['query', 'limit']),
+    'my-tasks': (operations.my_tasks, []),
+    'query-tasks': (operations.query_tasks, ['assignee', 'priority', 'status', 'project', 'after', 'before', 'within']),
+    'show-project': (operations.get_project, ['project']),
+    'list-projects': (operations.list_projects, []),
+    'list-archive': (operations.list_archived, []),
+    'restore-project': (operations.restore_project, ['project']),
+    'edit-task': (operations.edit_task, ['project', 'task', 'description', 'details', 'priority', 'status']),
+}
+
+# Defaults of arguments that may be left out, by name or by (command, name)
+OPTIONAL_ARGS = {
+    'details': '',
+    ('edit-task', 'description'): None,
+    ('edit-task', 'priority'): None,
+    ('edit-task', 'status'): None,
+    ('list-comments', 'page'): 0,
+    ('search', 'limit'): 20,
+    ('query-tasks', 'assignee'): None,
+    ('query-tasks', 'priority'): None,
+    ('query-tasks', 'status'): None,
+    ('query-tasks', 'project'): None,
+    ('query-tasks', 'after'): None,
+    ('query-tasks', 'before'): None,
+    ('query-tasks', 'within'): None,
+}
+
+
+def _optional(command, name):
+    # Return (whether the argument may be left out, its default)
+    for key in ((command, name), name):
+        if key in OPTIONAL_ARGS:
+            return True, OPTIONAL_ARGS[key]
+    return False, None
+
+
+def check_user(username):
+    """Make sure the acting user has an active account."""
+    # The session keeps the user for the following commands of a batch
+    user = get_session_user(username)
+    if not user:
+        raise OperationError(f"User {username} not found.")
+    if not user['active']:
+        raise OperationError("Your account is inactive. Please contact the administrator.")
+
+
+def _text(name, value):
+    # Arguments come from the command line, JSON lines and request bodies; only text and numbers make sense
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise OperationError(f"The {name} argument must be a string.")
+    return str(value)
+
+
+def run_command(command, arguments):
+    """Run one command with a dict of arguments and return its result."""
+    if not isinstance(command, str) or command not in COMMANDS:
+        raise OperationError(f"Unknown command: {command}")
+    username = arguments.get('user')
+    if not username:
+        raise OperationError("The user argument is required.")
+    username = _text('user', username)
+    check_user(username)
+    operation, names = COMMANDS[command]
+    values = []
+    for name in names:
+        if arguments.get(name) is None:
+            optional, default = _optional(command, name)
+            if not optional:
+                raise OperationError(f"The {name} argument is required for {command}.")
+            values.append(default)
+        else:
+            values.append(_text(name, arguments[name]))
+    return operation(username, *values)
+
+
+def run_batch(batch_file):
+    """Apply every command in a JSONL file as one transaction: one load and one save per data file.
+
+    Each line is an object such as {"command": "add-member", "user": "ali",
+    "project": "Website", "member": "sara"}. Lines that fail are reported and
+    skipped; the others are still applied.
+    """
+    applied = 0
+    failed = 0
+    with open(batch_file, 'r') as file, operations.transaction():
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                arguments = json.loads(line)
+                if not isinstance(arguments, dict):
+                    raise OperationError("Each line must be a JSON object.")
+                run_command(arguments.get('command'), arguments)
+                applied += 1
+            except (OperationError, json.JSONDecodeError) as e:
+                failed += 1
+                print(f"Line {line_number}: {e}")
+    print(f"{applied} commands applied, {failed} failed.")
+    stats = storage.write_stats()
+    print(f"{stats['written']} records written in {stats['files']} file writes; {stats['skipped']} unchanged writes skipped.")
+    return failed == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run project and task operations without the interactive menu.")
+    parser.add_argument("--batch", metavar="FILE", help="JSONL file of commands to apply in one go")
+    subparsers = parser.add_subparsers(dest="command")
+    for command, (_, names) in COMMANDS.items():
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument("--user", required=True, help="Username to act as")
+        for name in names:
+            subparser.add_argument(f"--{name}", required=not _optional(command, name)[0])
+
+    args = parser.parse_args(argv)
+    start_exporter()
+
+    if args.batch:
+        return 0 if run_batch(args.batch) else 1
+    if not args.command:
+        parser.print_help()
+        return 1
+    try:
+        result = run_command(args.command, vars(args))
+    except OperationError as e:
+        print(f"Error: {e}")
+        return 1
+    if result is not None:
+        print(json.dumps(result, indent=4, default=encode))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
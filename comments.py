@@ -0,0 +1,150 @@
+import json
+import os
+from storage import file_lock
+
+# Directory holding '<project id>/<task id>.jsonl', the comments of each task in the order they were added;
+# relative to the working directory, like the data files the comments belong to
+COMMENTS_DIR = os.environ.get('TRELLOMIZE_COMMENTS_DIR', 'comments')
+# Comments shown per page, newest first
+PAGE_SIZE = 10
+# Bytes read at a time when reading a comment file backwards
+READ_BLOCK = 8 * 1024
+# One line per comment added, naming its project and task, for readers that follow new comments
+FEED_NAME = 'feed.jsonl'
+
+
+def comments_path(project_id, task_id, comments_dir=COMMENTS_DIR):
+    return os.path.join(comments_dir, project_id, task_id + '.jsonl')
+
+
+# Function to add a comment to the end of its task's comment file
+def append_comment(project_id, task_id, comment, comments_dir=COMMENTS_DIR):
+    """Append one comment and note it in the feed; the project itself is not read or rewritten.
+
+    Each task's comment file has its own lock, so comments on different
+    tasks do not wait for each other; only the one-line feed write is shared.
+    """
+    os.makedirs(os.path.join(comments_dir, project_id), exist_ok=True)
+    file_path = comments_path(project_id, task_id, comments_dir)
+    with file_lock(file_path):
+        with open(file_path, 'ab') as file:
+            file.write((json.dumps(comment) + '\n').encode('utf-8'))
+    # Noted after the comment is written, so a feed reader always finds it
+    feed_path = os.path.join(comments_dir, FEED_NAME)
+    with file_lock(feed_path):
+        with open(feed_path, 'ab') as file:
+            file.write((json.dumps({'project': project_id, 'task': task_id}) + '\n').encode('utf-8'))
+    return comment
+
+
+# Function to read the comments of a task from a byte offset on, oldest first
+def read_comments(project_id, task_id, offset=0, comments_dir=COMMENTS_DIR):
+    """Return (the comments after offset, the offset just past the last complete one)."""
+    comments = []
+    try:
+        with open(comments_path(project_id, task_id, comments_dir), 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    # Still being written; read it next time
+                    break
+                offset += len(line)
+                try:
+                    comments.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return comments, offset
+
+
+# Function to read the feed of added comments from a byte offset on
+def read_feed(offset=0, comments_dir=COMMENTS_DIR):
+    """Return ((project id, task id) of each comment added after offset, the new offset)."""
+    added = []
+    try:
+        with open(os.path.join(comments_dir, FEED_NAME), 'rb') as file:
+            if os.fstat(file.fileno()).st_size < offset:
+                # The comments were replaced; start over
+                offset = 0
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                added.append((entry['project'], entry['task']))
+    except FileNotFoundError:
+        pass
+    return added, offset
+
+
+def _lines_backwards(file_path):
+    # Yield the complete lines of a file from the last to the first
+    with open(file_path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        rest = b''
+        while position > 0:
+            size = min(READ_BLOCK, position)
+            position -= size
+            file.seek(position)
+            lines = (file.read(size) + rest).split(b'\n')
+            # The first piece may be the end of a line that starts in an earlier block
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if rest.strip():
+            yield rest
+
+
+# Function to go through the comments of a task from the newest
+def iter_comments(project_id, task, comments_dir=COMMENTS_DIR):
+    """Yield the comments of a task newest first.
+
+    Comments added before they moved out of the projects file are still in
+    task['comments'] and come after the ones in the task's comment file.
+    """
+    file_path = comments_path(project_id, task['id'], comments_dir)
+    if os.path.exists(file_path):
+        for line in _lines_backwards(file_path):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Half-written by a session that crashed
+                continue
+    yield from reversed(task.get('comments') or [])
+
+
+# Function to read one page of the comments of a task
+def comment_page(project_id, task, page=0, page_size=PAGE_SIZE, comments_dir=COMMENTS_DIR):
+    """Return (comments of page number 'page', newest first, whether older comments remain).
+
+    Only the end of the comment file up to the requested page is read.
+    """
+    start = page * page_size
+    comments = []
+    for number, comment in enumerate(iter_comments(project_id, task, comments_dir)):
+        if number >= start + page_size:
+            return comments, True
+        if number >= start:
+            comments.append(comment)
+    return comments, False
+
+
+# Function to print the comments of a task a page at a time, newest first
+def show_comments(console, user, project, task, prefix):
+    # Imported here because operations itself imports this module
+    import operations
+    page = 0
+    while True:
+        result = operations.task_comments(user['username'], project, task, page)
+        for comment in result['comments']:
+            console.print(f"{prefix}{comment['timestamp']} - {comment['username']}: {comment['content']}", style="bold yellow")
+        if not result['more'] or console.input("Show older comments? (y/n): ").strip().lower() != 'y':
+            return
+        page += 1
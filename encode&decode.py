@@ -1,17 +1,13 @@
-def encode_password(password):
-    return base64.b64encode(password.encode('utf-8')).decode('utf-8')
+from passwords import hash_password, verify_password
 
 
-def decode_password(encoded_password):
-    return base64.b64decode(encoded_password.encode('utf-8')).decode('utf-8')
-    
 # Function to create a user account
 def create_account(username, password, email, is_manager):
     users = load_data(DATA_FILE)
     if any(user['username'] == username for user in users):
         console.print("This username is already taken.", style="bold red")
         return False
-    encoded_password = encode_password(password)
+    encoded_password = hash_password(password)
     user = {
         'id': str(uuid.uuid4()),
         'username': username,
@@ -29,9 +25,8 @@ def create_account(username, password, email, is_manager):
 # Function to log in to a user account
 def login(username, password):
     users = load_data(DATA_FILE)
-    encoded_password = encode_password(password)
     for user in users:
-        if user['username'] == username and user['password'] == encoded_password:
+        if user['username'] == username and verify_password(password, user['password']):
             if user['active']:
                 console.print(f"Welcome back, {username}! You are logged in as {'a manager' if user['role'] == 'manager' else 'a member'}.", style="bold blue")
                 return user
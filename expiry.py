@@ -0,0 +1,147 @@
+import heapq
+import os
+import time
+from datetime import datetime
+from loguru import logger
+import storage
+from operations import log_action, after_commit
+from archive import archive_project
+from models import field
+
+# Path to the projects data file the scheduler watches
+PROJECTS_FILE = 'projects.json'
+# Seconds between checks for projects written by other sessions
+RESCAN_INTERVAL = float(os.environ.get('TRELLOMIZE_EXPIRY_RESCAN', '60'))
+
+
+def _epoch(end_time):
+    # Projects and tasks without an end time count as already expired
+    if isinstance(end_time, str):
+        end_time = datetime.fromisoformat(end_time)
+    return end_time.timestamp() if end_time else 0
+
+
+# Function to move an expired project to the archive
+def delete_expired_project(project, file_path=PROJECTS_FILE):
+    after_commit(archive_project, project, 'expired')
+    storage.delete_record(project['id'], file_path)
+    log_action(f"Project {project.get('title')} expired and was archived", 'project_expired', None, project['id'], title=project.get('title'))
+
+
+# Function to note that a task passed its end time
+def report_expired_task(project, task, file_path=PROJECTS_FILE):
+    log_action(f"Task {task.get('description')} of project {project.get('title')} passed its end time", 'task_expired', None, project['id'], task['id'])
+
+
+class ExpiryScheduler:
+    """Min-heap of project and task end times, popped as they fall due.
+
+    The heap is filled from the projects once, then kept current from the
+    storage observers: a saved project only pushes the end times that
+    changed, and entries made stale by later changes or deletions are
+    dropped when they reach the top. run_due compares the top of the heap
+    with the clock, so it reads nothing until an entry is due; only every
+    RESCAN_INTERVAL seconds does it check the file's stamp for writes made
+    by other sessions.
+    """
+
+    def __init__(self, file_path=PROJECTS_FILE, on_project_expired=delete_expired_project, on_task_expired=report_expired_task):
+        self.file_path = file_path
+        self.on_project_expired = on_project_expired
+        self.on_task_expired = on_task_expired
+        self.heap = []
+        self.scheduled = {}
+        self.loaded = False
+        self.stamp = None
+        self.checked = 0
+        storage.add_observer(file_path, self.on_change)
+
+    def load(self):
+        self.heap = []
+        self.scheduled = {}
+        self.stamp = storage.get_backend().stamp(self.file_path)
+        # Only the end times are kept, so the projects are streamed rather than loaded
+        for project in storage.iter_records(self.file_path):
+            self._schedule(project)
+        self.loaded = True
+        self.checked = time.monotonic()
+
+    def _push(self, project_id, task_id, end_time):
+        key = (project_id, task_id)
+        if key in self.scheduled and self.scheduled[key] == end_time:
+            return
+        try:
+            due = _epoch(end_time)
+        except ValueError:
+            # One bad record must not stop the check for all the others
+            logger.warning(f"Unreadable end time {end_time!r} of project {project_id} task {task_id or '-'}; it will not expire")
+            self.scheduled.pop(key, None)
+            return
+        self.scheduled[key] = end_time
+        heapq.heappush(self.heap, (due, project_id, task_id, end_time))
+
+    def _schedule(self, project):
+        # Models hold their end times parsed already
+        self._push(project['id'], '', field(project, 'end_time'))
+        for task in project.get('tasks', []):
+            self._push(project['id'], task['id'], field(task, 'end_time'))
+
+    def on_change(self, change, payload, stamp_before, stamp_after):
+        if not self.loaded:
+            return
+        if self.stamp != stamp_before or change in ('replace', 'discard'):
+            # Written elsewhere, or replaced as a whole: refill on the next run
+            self.loaded = False
+            return
+        if change == 'save':
+            self._schedule(payload)
+        self.stamp = stamp_after
+
+    def next_due(self):
+        """Return the epoch time of the earliest scheduled end time, or None."""
+        return self.heap[0][0] if self.heap else None
+
+    def run_due(self, now=None):
+        """Expire every project and task whose end time has passed; return how many were handled."""
+        if self.loaded and time.monotonic() - self.checked >= RESCAN_INTERVAL:
+            self.checked = time.monotonic()
+            if storage.get_backend().stamp(self.file_path) != self.stamp:
+                self.loaded = False
+        if not self.loaded:
+            self.load()
+        now = time.time() if now is None else now
+        handled = 0
+        while self.heap and self.heap[0][0] <= now:
+            _, project_id, task_id, end_time = heapq.heappop(self.heap)
+            if self.scheduled.get((project_id, task_id)) != end_time:
+                # Superseded by a later end time
+                continue
+            del self.scheduled[(project_id, task_id)]
+            project = storage.get_record(project_id, self.file_path)
+            if project is None:
+                continue
+            if not task_id:
+                if field(project, 'end_time') == end_time:
+                    self.on_project_expired(project, self.file_path)
+                    handled += 1
+                continue
+            for task in project.get('tasks', []):
+                if task['id'] == task_id and field(task, 'end_time') == end_time:
+                    self.on_task_expired(project, task, self.file_path)
+                    handled += 1
+        return handled
+
+
+_schedulers = {}
+
+
+def get_scheduler(file_path=PROJECTS_FILE):
+    """Return the shared scheduler for a projects file."""
+    if file_path not in _schedulers:
+        _schedulers[file_path] = ExpiryScheduler(file_path)
+    return _schedulers[file_path]
+
+
+# Function to expire the projects and tasks that are due
+def run_due(file_path=PROJECTS_FILE):
+    return get_scheduler(file_path).run_due()
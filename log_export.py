@@ -0,0 +1,136 @@
+import atexit
+import json
+import os
+import threading
+from storage import file_lock
+from log_reader import LOG_FILE, log_files
+
+# JSONL file the log lines are exported to
+EXPORT_FILE = os.environ.get('TRELLOMIZE_LOG_EXPORT', os.path.join(os.path.dirname(__file__), 'logs.jsonl'))
+# Seconds between two background exports
+EXPORT_INTERVAL = float(os.environ.get('TRELLOMIZE_LOG_EXPORT_INTERVAL', '5'))
+
+
+def checkpoint_path(export_path):
+    return export_path + '.checkpoint'
+
+
+def read_checkpoint(export_path):
+    """Return the log file inode and byte offset the last export stopped at."""
+    try:
+        with open(checkpoint_path(export_path), 'r') as file:
+            checkpoint = json.load(file)
+        return checkpoint['inode'], checkpoint['offset']
+    except (OSError, ValueError, KeyError):
+        return None, 0
+
+
+def write_checkpoint(export_path, inode, offset):
+    tmp_path = checkpoint_path(export_path) + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump({'inode': inode, 'offset': offset}, file)
+    os.replace(tmp_path, checkpoint_path(export_path))
+
+
+def export_new_logs(log_path=LOG_FILE, export_path=EXPORT_FILE):
+    """Append the log lines written since the last export to the JSONL export.
+
+    Only the bytes after the saved checkpoint are read, so the cost follows
+    the amount of new log output. When the log was rotated since then, the
+    rest of the rotated file the checkpoint points into is exported first,
+    then every newer file. A line that is still being written is left for the
+    next export. Returns the number of lines exported.
+    """
+    with file_lock(export_path):
+        inode, offset = read_checkpoint(export_path)
+        files = []
+        for path in log_files(log_path):
+            try:
+                files.append((path, os.stat(path).st_ino))
+            except FileNotFoundError:
+                continue
+        if not files:
+            return 0
+        start = 0
+        for position, (path, file_inode) in enumerate(files):
+            if file_inode == inode:
+                start = position
+                break
+        else:
+            # The checkpointed file is gone (or this is the first export); take everything left
+            offset = 0
+        count = 0
+        for path, file_inode in files[start:]:
+            last = path == files[-1][0]
+            try:
+                log_file = open(path, 'rb')
+            except FileNotFoundError:
+                # Rotated away meanwhile; the next export finds it by its inode
+                break
+            with log_file:
+                size = os.fstat(log_file.fileno()).st_size
+                if size < offset:
+                    offset = 0
+                log_file.seek(offset)
+                chunk = log_file.read(size - offset)
+            # Rotated files are complete; the current one may end in a half-written line
+            end = chunk.rfind(b'\n') + 1 if last else len(chunk)
+            lines = chunk[:end].decode('utf-8', errors='replace').splitlines()
+            entries = [json.dumps({'log': line}) + '\n' for line in lines if line]
+            if entries:
+                with open(export_path, 'a') as export_file:
+                    export_file.writelines(entries)
+                    export_file.flush()
+                    os.fsync(export_file.fileno())
+                count += len(entries)
+            inode, offset = file_inode, offset + end
+            write_checkpoint(export_path, inode, offset)
+            offset = 0
+    return count
+
+
+class LogExporter:
+    """Exports new log lines in the background every interval seconds and once more at exit."""
+
+    def __init__(self, log_path=LOG_FILE, export_path=EXPORT_FILE, interval=EXPORT_INTERVAL):
+        self.log_path = log_path
+        self.export_path = export_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            return export_new_logs(self.log_path, self.export_path)
+        except OSError:
+            # Exporting is best effort; the lines stay in app.log for the next attempt
+            return 0
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.export()
+
+
+_exporter = None
+
+
+# Function to start the shared background log exporter
+def start_exporter():
+    global _exporter
+    if _exporter is None:
+        _exporter = LogExporter()
+        _exporter.start()
+    return _exporter
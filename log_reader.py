@@ -0,0 +1,98 @@
+import itertools
+import json
+import os
+
+# Log file written by loguru; rotated copies are renamed to 'app.<time>.log' next to it
+LOG_FILE = os.path.join(os.path.dirname(__file__), 'app.log')
+
+
+def log_files(log_path=LOG_FILE):
+    """Return the rotated copies of a log file oldest first, followed by the log file itself."""
+    directory = os.path.dirname(log_path) or '.'
+    stem, extension = os.path.splitext(os.path.basename(log_path))
+    rotated = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.startswith(stem + '.') and name.endswith(extension) and name != stem + extension:
+            path = os.path.join(directory, name)
+            try:
+                rotated.append((os.stat(path).st_mtime_ns, name, path))
+            except FileNotFoundError:
+                # Removed by retention while listing
+                continue
+    files = [path for _, _, path in sorted(rotated)]
+    if os.path.exists(log_path):
+        files.append(log_path)
+    return files
+
+
+def iter_log_lines(log_path=LOG_FILE):
+    """Yield every log line, across rotated files, in the order it was written.
+
+    Files are read one line at a time, so memory use does not grow with the
+    size of the logs.
+    """
+    for path in log_files(log_path):
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as file:
+                for line in file:
+                    line = line.rstrip('\n')
+                    if line:
+                        yield line
+        except FileNotFoundError:
+            continue
+
+
+def show_logs(log_path=LOG_FILE):
+    """Return an iterator over all log lines, or None when there are none."""
+    if not log_files(log_path):
+        print("Log file does not exist.")
+        return None
+    lines = iter_log_lines(log_path)
+    first = next(lines, None)
+    if first is None:
+        print("Log file is empty.")
+        return None
+    return itertools.chain([first], lines)
+
+
+def save_logs_to_json(json_file_path, log_path=LOG_FILE):
+    logs = show_logs(log_path)
+    if logs is None:
+        print("No logs to save.")
+        return
+
+    if os.path.exists(json_file_path):
+        with open(json_file_path, 'r') as json_file:
+            try:
+                log_data = json.load(json_file)
+            except json.JSONDecodeError:
+                log_data = []
+    else:
+        log_data = []
+
+    existing_logs = set(entry['log'] for entry in log_data)
+
+    # Write the saved entries and then the new lines straight from the reader
+    tmp_path = json_file_path + '.tmp'
+    new_count = 0
+    with open(tmp_path, 'w') as json_file:
+        json_file.write('[')
+        separator = '\n'
+        for entry in log_data:
+            json_file.write(separator + '    ' + json.dumps(entry))
+            separator = ',\n'
+        for line in logs:
+            if line not in existing_logs:
+                existing_logs.add(line)
+                json_file.write(separator + '    ' + json.dumps({"log": line}))
+                separator = ',\n'
+                new_count += 1
+        json_file.write('\n]\n')
+
+    if not new_count:
+        os.remove(tmp_path)
+        print("No new logs to save.")
+        return
+
+    os.replace(tmp_path, json_file_path)
+    print(f"Logs have been saved to {json_file_path}")
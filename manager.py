@@ -1,17 +1,19 @@
 import argparse
 import json
 import os
-import base64
+import uuid
+import storage
+import passwords
+import log_export
+import activity
+import archive
+from project_index import find_project_by_title
 
 # Define the path to the admin data file
 ADMIN_FILE = 'admin.json'
 DATA_FILE = 'users.json'
 PROJECTS_FILE = 'projects.json'
 
-def encode_password(password):
-    """Encode the password using base64."""
-    return base64.b64encode(password.encode('utf-8')).decode('utf-8')
-
 def create_admin(username, password):
     """Create an admin account and save it to a JSON file."""
     if os.path.exists(ADMIN_FILE):
@@ -21,8 +23,8 @@ def create_admin(username, password):
                 print("Error: An admin with this username already exists.")
                 return
 
-    # Encode the password
-    encoded_password = encode_password(password)
+    # Hash the password
+    encoded_password = passwords.hash_password(password)
     
     # Create admin data
     admin_data = {
@@ -57,11 +59,102 @@ def purge_data():
     else:
         print("Data deletion canceled.")
 
+def migrate_to_sqlite():
+    """Copy users.json and projects.json into the sqlite database."""
+    counts = storage.migrate_json_to_sqlite([DATA_FILE, PROJECTS_FILE])
+    for file_path, count in counts.items():
+        print(f"Migrated {count} records from {file_path}.")
+    print(f"Data is now available in {storage.SQLITE_FILE}. Set TRELLOMIZE_STORAGE=sqlite to use it.")
+
+def export_logs():
+    """Append the log lines written since the last export to the JSONL log export."""
+    count = log_export.export_new_logs()
+    print(f"Exported {count} new log lines to {log_export.EXPORT_FILE}.")
+
+def query_logs(actor=None, project=None, action=None, since=None, until=None):
+    """Print the activity events matching every given filter, oldest first."""
+    project_id = None
+    if project:
+        # Accept a project title as well as an id
+        found = find_project_by_title(project, PROJECTS_FILE)
+        project_id = found['id'] if found else project
+    count = 0
+    for event in activity.query_events(actor, project_id, action, since, until):
+        print(json.dumps(event))
+        count += 1
+    print(f"{count} events found.")
+
+def list_archive(title=None):
+    """Print the index entries of the archived projects, optionally only those with a title."""
+    entries = archive.find_archived(title)
+    for entry in entries:
+        print(json.dumps(entry))
+    print(f"{len(entries)} archived projects found.")
+
+def generate_board(task_count, tasks_per_project=100):
+    """Build a board of projects holding task_count tasks, for benchmarks."""
+    members = [f"user{number}" for number in range(20)]
+    projects = []
+    for project_number in range((task_count + tasks_per_project - 1) // tasks_per_project):
+        tasks = []
+        for task_number in range(min(tasks_per_project, task_count - project_number * tasks_per_project)):
+            tasks.append({
+                'id': str(uuid.uuid4()),
+                'description': f"Task {task_number} of project {project_number}",
+                'details': "Generated for the storage format benchmark",
+                'assigned_to': members[task_number % len(members)],
+                'priority': ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL'][task_number % 4],
+                'status': ['BACKLOG', 'TODO', 'DOING', 'DONE', 'ARCHIVED'][task_number % 5],
+                'comments': [{'username': members[0], 'content': "Looks good", 'timestamp': '2026-01-01T10:00:00'}],
+                'start_time': '2026-01-01T09:00:00',
+                'end_time': '2026-01-02T09:00:00',
+            })
+        projects.append({
+            'id': str(uuid.uuid4()),
+            'title': f"Project {project_number}",
+            'leader': members[project_number % len(members)],
+            'members': members,
+            'tasks': tasks,
+            'start_time': '2026-01-01T09:00:00',
+            'end_time': '2026-01-02T09:00:00',
+            'version': 1,
+        })
+    return projects
+
+def benchmark_formats(task_count=100000):
+    """Compare save time, load time and file size of the data file formats."""
+    data = generate_board(task_count)
+    print(f"Board of {len(data)} projects with {task_count} tasks; current format: {storage.DATA_FORMAT}")
+    for result in storage.benchmark_formats(data):
+        if not result['available']:
+            print(f"{result['format']}: not installed")
+            continue
+        print(f"{result['format']}: save {result['save_seconds'] * 1000:.0f} ms, load {result['load_seconds'] * 1000:.0f} ms, "
+              f"{result['bytes'] / 1024 / 1024:.1f} MB")
+
+def benchmark_hashing(threads=None):
+    """Measure login latency and throughput at a range of password hashing costs."""
+    settings = [passwords.current_params()]
+    settings += [{'method': 'scrypt', 'n': 2 ** exponent, 'r': 8, 'p': 1} for exponent in (12, 13, 14, 15, 16)]
+    settings += [{'method': 'pbkdf2', 'hash_name': 'sha256', 'iterations': iterations} for iterations in (100000, 300000, 600000, 1000000)]
+    print(f"Current setting: {settings[0]}")
+    for result in passwords.benchmark(settings, threads):
+        params = ', '.join(f"{key}={value}" for key, value in result['params'].items())
+        print(f"{params}: median {result['median_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+              f"{result['logins_per_second']:.1f} logins/s with {result['threads']} concurrent logins")
+
 def main():
     parser = argparse.ArgumentParser(description="Manage admin accounts for the system.")
-    parser.add_argument("command", choices=['create-admin', 'purge-data'], help="Command to execute")
+    parser.add_argument("command", choices=['create-admin', 'purge-data', 'migrate-sqlite', 'export-logs', 'query-logs', 'list-archive', 'benchmark-hash', 'benchmark-format'], help="Command to execute")
     parser.add_argument("--username", help="Username for the admin")
     parser.add_argument("--password", help="Password for the admin")
+    parser.add_argument("--threads", type=int, help="benchmark-hash: concurrent logins (default: CPU count)")
+    parser.add_argument("--tasks", type=int, default=100000, help="benchmark-format: tasks in the generated board")
+    parser.add_argument("--actor", help="query-logs: only events by this user")
+    parser.add_argument("--project", help="query-logs: only events on this project (title or id); list-archive: only projects with this title")
+    parser.add_argument("--action", help="query-logs: only events of this action, e.g. assign_task")
+    parser.add_argument("--since", help="query-logs: only events at or after this ISO date or time")
+    parser.add_argument("--until", help="query-logs: only events at or before this ISO date or time")
     
     args = parser.parse_args()
     
@@ -72,6 +165,18 @@ def main():
             print("Username and password are required for creating an admin.")
     elif args.command == 'purge-data':
         purge_data()
+    elif args.command == 'migrate-sqlite':
+        migrate_to_sqlite()
+    elif args.command == 'export-logs':
+        export_logs()
+    elif args.command == 'query-logs':
+        query_logs(args.actor, args.project, args.action, args.since, args.until)
+    elif args.command == 'list-archive':
+        list_archive(args.project)
+    elif args.command == 'benchmark-hash':
+        benchmark_hashing(args.threads)
+    elif args.command == 'benchmark-format':
+        benchmark_formats(args.tasks)
 
 if __name__ == '__main__':
     main()
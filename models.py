@@ -0,0 +1,228 @@
+import os
+import sys
+from collections.abc import MutableMapping
+from datetime import datetime
+from enum import Enum
+
+
+class Priority(Enum):
+    LOW = 'LOW'
+    MEDIUM = 'MEDIUM'
+    HIGH = 'HIGH'
+    CRITICAL = 'CRITICAL'
+
+class Status(Enum):
+    BACKLOG = 'BACKLOG'
+    TODO = 'TODO'
+    DOING = 'DOING'
+    DONE = 'DONE'
+    ARCHIVED = 'ARCHIVED'
+
+
+class _Missing:
+    """Marks a field the stored record does not have."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+class Model(MutableMapping):
+    """A stored record with one slot per known field.
+
+    Models are built from the decoded JSON when storage loads a file and
+    turned back into plain dicts only when storage writes it. In between
+    the fields are held parsed: TIMES as datetimes, ENUMS as their enum
+    members and NAMES (usernames) as interned strings, and fields the
+    class does not know are kept in 'extra'.
+
+    Models also behave as the dicts they replace: record['end_time'] still
+    gives the ISO string and record['status'] the status name, so code
+    written against the JSON records keeps working. Hot paths read the
+    attributes instead (record.end_time is a datetime).
+    """
+
+    __slots__ = ('extra',)
+    TIMES = ()
+    ENUMS = {}
+    NAMES = ()
+    CHILDREN = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        record.extra = None
+        for name in cls.__slots__:
+            setattr(record, name, MISSING)
+        for key, value in data.items():
+            record[key] = value
+        return record
+
+    def to_dict(self):
+        data = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is not MISSING:
+                data[name] = _plain(value)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def _parse(self, key, value):
+        if key in self.TIMES and isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                return value
+        if key in self.ENUMS and isinstance(value, str):
+            try:
+                return self.ENUMS[key](value)
+            except ValueError:
+                return value
+        # Lists are converted in place, so a caller still holding one (setdefault) sees the models
+        if key in self.NAMES:
+            if isinstance(value, str):
+                return sys.intern(value)
+            if isinstance(value, list):
+                value[:] = [sys.intern(item) if isinstance(item, str) else item for item in value]
+        if key in self.CHILDREN and isinstance(value, list):
+            child = self.CHILDREN[key]
+            value[:] = [item if isinstance(item, Model) else child.from_dict(item) for item in value]
+        return value
+
+    def __getitem__(self, key):
+        if key in self.__slots__ and key != 'extra':
+            value = getattr(self, key)
+            if value is MISSING:
+                raise KeyError(key)
+            if isinstance(value, datetime):
+                return value.isoformat()
+            if isinstance(value, Enum):
+                return value.value
+            return value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.__slots__ and key != 'extra':
+            setattr(self, key, self._parse(key, value))
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self.__slots__ and key != 'extra' and getattr(self, key) is not MISSING:
+            setattr(self, key, MISSING)
+        elif self.extra and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for name in self.__slots__:
+            if getattr(self, name) is not MISSING:
+                yield name
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.extra = None
+        for name in self.__slots__:
+            setattr(self, name, MISSING)
+        for key, value in state.items():
+            self[key] = value
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    if isinstance(value, Model):
+        return value.to_dict()
+    return value
+
+
+class Comment(Model):
+    __slots__ = ('username', 'content', 'timestamp')
+    TIMES = ('timestamp',)
+    NAMES = ('username',)
+
+
+class Task(Model):
+    __slots__ = ('id', 'description', 'details', 'assigned_to', 'priority', 'status', 'comments', 'start_time', 'end_time')
+    TIMES = ('start_time', 'end_time')
+    ENUMS = {'priority': Priority, 'status': Status}
+    NAMES = ('assigned_to',)
+    CHILDREN = {'comments': Comment}
+
+
+class Project(Model):
+    __slots__ = ('id', 'title', 'leader', 'members', 'tasks', 'start_time', 'end_time', 'version')
+    TIMES = ('start_time', 'end_time')
+    NAMES = ('leader', 'members')
+    CHILDREN = {'tasks': Task}
+
+
+class User(Model):
+    __slots__ = ('id', 'username', 'password', 'email', 'role', 'active', 'version')
+    NAMES = ('username', 'role')
+
+
+# Model of the records in each data file, by file name
+RECORD_TYPES = {
+    'projects.json': Project,
+    'users.json': User,
+}
+
+
+def record_type(file_path):
+    return RECORD_TYPES.get(os.path.basename(file_path))
+
+
+# Function to turn a decoded record of a data file into its model
+def to_model(record, file_path):
+    model = record_type(file_path)
+    if model is None or record is None or isinstance(record, Model):
+        return record
+    return model.from_dict(record)
+
+
+# Function to turn the decoded records of a data file into models
+def to_models(records, file_path):
+    model = record_type(file_path)
+    if model is None:
+        return records
+    return [record if isinstance(record, Model) else model.from_dict(record) for record in records]
+
+
+def field(record, name):
+    """Return a field as held by the model (datetime, enum member), or as stored in a plain dict; None if missing."""
+    if isinstance(record, Model):
+        value = getattr(record, name, None)
+        return None if value is MISSING else value
+    return record.get(name)
+
+
+def encode(value):
+    """json default= hook that writes models as the plain dicts they came from."""
+    if isinstance(value, Model):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
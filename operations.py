@@ -0,0 +1,483 @@
+import functools
+import inspect
+from contextlib import contextmanager
+import os
+import uuid
+from datetime import datetime, timedelta
+from loguru import logger
+import storage
+from storage import save_record, update_record, delete_record
+from project_index import find_project_by_title, update_task, summaries_led_by, summaries_joined_by
+from activity import make_event, record_events
+from user_index import find_user
+from archive import archive_project, find_archived, load_archived, mark_restored
+from comments import append_comment, comment_page
+import search_index
+import task_index
+import api_client
+from models import Priority, Status, Task
+
+
+log_file_path = os.path.join(os.path.dirname(__file__), 'app.log')
+
+logger.remove()
+logger.add(log_file_path, rotation="1 MB", retention="10 days", level="INFO")
+
+# Path to the data storage file
+DATA_FILE = 'users.json'
+PROJECTS_FILE = 'projects.json'
+
+
+class OperationError(Exception):
+    """Raised when an operation cannot be carried out; the message is meant for the user."""
+
+
+# Log lines and activity events, and comment and archive writes, held back by an open transaction()
+_pending_logs = None
+_pending_writes = None
+
+
+def log_action(action_message, action=None, actor=None, project_id=None, task_id=None, **details):
+    event = make_event(action, actor, project_id, task_id, **details) if action else None
+    if _pending_logs is not None:
+        _pending_logs.append((action_message, event))
+        return
+    logger.info(action_message)
+    if event:
+        record_events([event])
+
+
+def after_commit(write, *args):
+    """Call write(*args) now, or when the open transaction() has written its data.
+
+    For the files kept outside the storage batch, comments and the archive,
+    so that a transaction that fails leaves them as they were.
+    """
+    if _pending_writes is not None:
+        _pending_writes.append((write, args))
+        return
+    write(*args)
+
+
+@contextmanager
+def transaction():
+    """Apply every operation in the block as one unit of work.
+
+    The data changes are held in a storage batch and written once when the
+    block ends, followed by the comment and archive writes of the block
+    (see after_commit), and the log lines and activity events of the
+    operations are written after them in one go. The events are stamped
+    with the time they are written, so the activity files stay in time
+    order. If the block raises, the changes, the other writes and the log
+    entries are all dropped. A transaction opened inside another one joins
+    it.
+    """
+    global _pending_logs, _pending_writes
+    if _pending_logs is not None:
+        yield
+        return
+    _pending_logs = []
+    _pending_writes = []
+    try:
+        with storage.batch():
+            yield
+        pending = _pending_logs
+        writes = _pending_writes
+    finally:
+        _pending_logs = None
+        _pending_writes = None
+    for write, args in writes:
+        write(*args)
+    for action_message, _ in pending:
+        logger.info(action_message)
+    events = [event for _, event in pending if event]
+    if events:
+        now = datetime.now().replace(microsecond=0).isoformat()
+        for event in events:
+            event['time'] = now
+        record_events(events)
+
+
+def served(command):
+    """Send the operation to the API server instead of running it here when TRELLOMIZE_SERVER is set."""
+    def decorate(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if api_client.SERVER_URL:
+                # The route takes the operation's arguments in order, so keyword ones are put in their place
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                try:
+                    return api_client.run(command, *bound.args)
+                except api_client.ApiError as e:
+                    raise OperationError(str(e))
+            return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _project_led_by(leader_username, project_title):
+    project = find_project_by_title(project_title)
+    if not project or project['leader'] != leader_username:
+        raise OperationError("Project not found or you are not the leader of this project.")
+    return project
+
+
+def _task_for_editor(username, project_title, task_id):
+    # Tasks can be edited by the project leader and by the member they are assigned to
+    project = find_project_by_title(project_title)
+    if not project:
+        raise OperationError("Project not found.")
+    for task in project['tasks']:
+        if task['id'] == task_id:
+            if username != project['leader'] and username != task['assigned_to']:
+                raise OperationError("You are not the leader of this project or not assigned to this task.")
+            return project, task
+    raise OperationError("Task not found.")
+
+
+# Function to create a new project led by leader_username
+@served('create-project')
+def create_project(leader_username, title):
+    if find_project_by_title(title):
+        raise OperationError("A project with this title already exists. Please use a unique title.")
+    start_time = datetime.now().replace(microsecond=0)
+    end_time = start_time + timedelta(hours=24)
+    project = {
+        'id': str(uuid.uuid4()),
+        'title': title,
+        'leader': leader_username,
+        'members': [leader_username],
+        'tasks': [],
+        'start_time': start_time.isoformat(),
+        'end_time': end_time.isoformat()
+    }
+    save_record(project, PROJECTS_FILE)
+    log_action(f"User {leader_username} created a new project: {title}", 'create_project', leader_username, project['id'], title=title)
+    return project
+
+
+# Function to add a member to a project
+@served('add-member')
+def add_member(leader_username, project_title, username):
+    project = _project_led_by(leader_username, project_title)
+    if username in project['members']:
+        raise OperationError("This user is already a member of the project.")
+    def add(project):
+        if username not in project['members']:
+            project['members'].append(username)
+    update_record(project['id'], PROJECTS_FILE, add)
+    log_action(f"User {leader_username} added {username} to the project", 'add_member', leader_username, project['id'], member=username)
+
+
+# Function to remove a member from a project
+@served('remove-member')
+def remove_member(leader_username, project_title, username):
+    project = _project_led_by(leader_username, project_title)
+    if username not in project['members']:
+        raise OperationError("This user is not a member of the project.")
+    def remove(project):
+        if username in project['members']:
+            project['members'].remove(username)
+    update_record(project['id'], PROJECTS_FILE, remove)
+    log_action(f"User {leader_username} removed {username} from the project", 'remove_member', leader_username, project['id'], member=username)
+
+
+# Function to assign a new task to a member of a project
+@served('assign-task')
+def assign_task(leader_username, project_title, member_username, description, details=''):
+    project = _project_led_by(leader_username, project_title)
+    if member_username not in project['members']:
+        raise OperationError("This user is not a member of the project.")
+    start_time = datetime.now().replace(microsecond=0)
+    end_time = start_time + timedelta(hours=24)
+    task = {
+        'id': str(uuid.uuid4()),
+        'description': description,
+        'details': details,
+        'assigned_to': member_username,
+        'priority': Priority.LOW.value,  # Default priority
+        'status': Status.BACKLOG.value,  # Default status
+        'comments': [],
+        'start_time': start_time.isoformat(),
+        'end_time': end_time.isoformat()
+    }
+    update_record(project['id'], PROJECTS_FILE, lambda project: project.setdefault('tasks', []).append(Task.from_dict(task)))
+    log_action(f"User {leader_username} assigned task {description} to the {member_username}", 'assign_task', leader_username, project['id'], task['id'], member=member_username)
+    return task
+
+
+# Function to delete a project
+@served('delete-project')
+def delete_project(leader_username, project_title):
+    project = _project_led_by(leader_username, project_title)
+    # Keep a copy in the archive so the project can be restored
+    after_commit(archive_project, project, 'deleted', leader_username)
+    delete_record(project['id'], PROJECTS_FILE)
+    log_action(f"User {leader_username} deleted the project {project_title}", 'delete_project', leader_username, project['id'], title=project_title)
+
+
+# Function to change the description of a task
+@served('update-description')
+def update_task_description(username, project_title, task_id, description):
+    project, task = _task_for_editor(username, project_title, task_id)
+    old_description = task['description']
+    update_task(project['id'], task_id, lambda task: task.update(description=description))
+    log_action(f"{old_description}'s description changed to {description}", 'update_description', username, project['id'], task_id)
+
+
+# Function to change the details of a task
+@served('update-details')
+def update_task_details(username, project_title, task_id, details):
+    project, task = _task_for_editor(username, project_title, task_id)
+    update_task(project['id'], task_id, lambda task: task.update(details=details))
+    log_action(f"{task['description']}'s details changed to {details}", 'update_details', username, project['id'], task_id)
+
+
+# Function to change the priority of a task
+@served('set-priority')
+def change_task_priority(username, project_title, task_id, priority):
+    priority = priority.strip().upper()
+    if priority not in Priority.__members__:
+        raise OperationError("Invalid priority.")
+    project, task = _task_for_editor(username, project_title, task_id)
+    update_task(project['id'], task_id, lambda task: task.update(priority=priority))
+    log_action(f" Task {task['description']} priority has been updated to {priority}", 'change_priority', username, project['id'], task_id, priority=priority)
+
+
+# Function to change the status of a task
+@served('set-status')
+def change_task_status(username, project_title, task_id, status):
+    status = status.strip().upper()
+    if status not in Status.__members__:
+        raise OperationError("Invalid status.")
+    project, task = _task_for_editor(username, project_title, task_id)
+    update_task(project['id'], task_id, lambda task: task.update(status=status))
+    log_action(f" Task {task['description']} status has been updated to {status}", 'change_status', username, project['id'], task_id, status=status)
+
+
+# Function to change several fields of a task at once
+@served('edit-task')
+def edit_task(username, project_title, task_id, description=None, details=None, priority=None, status=None):
+    """Apply every given change (empty values are left alone) in one transaction.
+
+    The task is written once, and if any change is refused none is applied.
+    """
+    if not (description or details or priority or status):
+        raise OperationError("Nothing to change.")
+    # Check everything first: inside a server or batch transaction a failure halfway could not be undone
+    _task_for_editor(username, project_title, task_id)
+    if priority and priority.strip().upper() not in Priority.__members__:
+        raise OperationError("Invalid priority.")
+    if status and status.strip().upper() not in Status.__members__:
+        raise OperationError("Invalid status.")
+    with transaction():
+        if description:
+            update_task_description(username, project_title, task_id, description)
+        if details:
+            update_task_details(username, project_title, task_id, details)
+        if priority:
+            change_task_priority(username, project_title, task_id, priority)
+        if status:
+            change_task_status(username, project_title, task_id, status)
+
+
+# Function to add a comment to a task
+@served('add-comment')
+def add_comment(username, project_title, task_id, content):
+    project = find_project_by_title(project_title)
+    if not project or username not in project['members']:
+        raise OperationError("Project not found or you are not a member of this project.")
+    for task in project['tasks']:
+        if task['id'] == task_id and (task['assigned_to'] == username or username == project['leader']):
+            comment = {
+                'timestamp': datetime.now().replace(microsecond=0).isoformat(),
+                'username': username,
+                'content': content
+            }
+            # Comments live in the task's own comment file; the project is not rewritten
+            after_commit(append_comment, project['id'], task_id, comment)
+            log_action(f"Comment was added in {task['description']} task", 'add_comment', username, project['id'], task_id)
+            return comment
+    raise OperationError("Task not found or not assigned to you.")
+
+
+# Function to read a page of the comments of a task, newest first
+@served('list-comments')
+def list_comments(username, project_title, task_id, page=0):
+    project = find_project_by_title(project_title)
+    if not project or (username not in project['members'] and username != project['leader']):
+        raise OperationError("Project not found or you are not a member of this project.")
+    try:
+        page = int(page)
+    except (TypeError, ValueError):
+        raise OperationError("The page must be a number.")
+    for task in project['tasks']:
+        if task['id'] == task_id:
+            comments, more = comment_page(project['id'], task, max(page, 0))
+            return {'comments': comments, 'more': more}
+    raise OperationError("Task not found.")
+
+
+# Function to read a page of the comments of a task the caller already fetched
+def task_comments(username, project, task, page=0):
+    if api_client.SERVER_URL:
+        return list_comments(username, project['title'], task['id'], page)
+    # The project was read and checked already; only the comment file is read
+    comments, more = comment_page(project['id'], task, page)
+    return {'comments': comments, 'more': more}
+
+
+# Function to search the tasks of every project the user can see
+@served('search')
+def search_tasks(username, query, limit=search_index.LIMIT):
+    """Return the tasks whose description, details or comments hold every word of query, best first."""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise OperationError("The limit must be a number.")
+    if not search_index.words(query):
+        raise OperationError("Enter at least one word to search for.")
+    return search_index.search_tasks(username, query, max(limit, 1))
+
+
+def _choices(value, allowed, name):
+    # 'HIGH,critical' -> {'HIGH', 'CRITICAL'}, checked against the allowed names
+    choices = {choice.strip().upper() for choice in value.split(',') if choice.strip()}
+    for choice in choices:
+        if choice not in allowed:
+            raise OperationError(f"Invalid {name}: {choice}.")
+    return choices
+
+
+def _time(value, name):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise OperationError(f"The {name} time must be an ISO date such as 2024-05-01T12:00.")
+
+
+# Function to find tasks by assignee, priority, status, project and end time
+@served('query-tasks')
+def query_tasks(username, assignee=None, priority=None, status=None, project_title=None, after=None, before=None, within=None):
+    """Return the tasks of the user's projects that meet every given criterion, earliest end time first.
+
+    assignee, priority and status take comma-separated values, after and
+    before bound the end time, and within (hours) means an end time
+    between now and that many hours from now.
+    """
+    criteria = {}
+    if assignee:
+        criteria['assigned_to'] = {name.strip() for name in assignee.split(',') if name.strip()}
+    if priority:
+        criteria['priority'] = _choices(priority, Priority.__members__, 'priority')
+    if status:
+        criteria['status'] = _choices(status, Status.__members__, 'status')
+    if project_title:
+        project = find_project_by_title(project_title)
+        criteria['project'] = {project['id']} if project else set()
+    low = _time(after, 'after') if after else None
+    high = _time(before, 'before') if before else None
+    if within:
+        try:
+            hours = float(within)
+        except (TypeError, ValueError):
+            raise OperationError("within must be a number of hours.")
+        now = datetime.now().timestamp()
+        low = now if low is None else low
+        high = now + hours * 3600 if high is None else min(high, now + hours * 3600)
+    if low is not None or high is not None:
+        criteria['due'] = (low, high)
+    return task_index.query_tasks(username, criteria)
+
+
+# Function to list the tasks assigned to a user across all their projects
+@served('my-tasks')
+def my_tasks(username):
+    """Return {status: tasks} for every task assigned to username, most urgent priority first, then earliest end time.
+
+    Served from the task index's assignee table, so only the user's own
+    tasks are looked at however many projects there are.
+    """
+    ranks = {priority.value: rank for rank, priority in enumerate(reversed(Priority))}
+    tasks = task_index.query_tasks(username, {'assigned_to': {username}})
+    # query_tasks orders by end time, and the sort below keeps that order within a priority
+    tasks.sort(key=lambda task: ranks.get(task['priority'], len(ranks)))
+    grouped = {status.value: [] for status in Status}
+    for task in tasks:
+        grouped.setdefault(task['status'], []).append(task)
+    return grouped
+
+
+# Function to get a project the user leads or is a member of
+@served('show-project')
+def get_project(username, project_title):
+    project = find_project_by_title(project_title)
+    if not project or (username not in project['members'] and username != project['leader']):
+        raise OperationError("Project not found or you are not a member of this project.")
+    return project
+
+
+# Function to list the projects a user leads and the projects they are a member of
+@served('list-projects')
+def list_projects(username):
+    return {
+        'led': summaries_led_by(username),
+        'joined': summaries_joined_by(username),
+    }
+
+
+# Function to list the projects a user leads
+def list_projects_led(username):
+    return list_projects(username)['led']
+
+
+# Function to list the projects a user is a member of
+def list_projects_joined(username):
+    return list_projects(username)['joined']
+
+
+# Function to list the archived projects a user led
+@served('list-archive')
+def list_archived(username):
+    return [{'title': entry['title'], 'reason': entry['reason'], 'archived_at': entry['archived_at']}
+            for entry in find_archived(leader=username)]
+
+
+# Function to bring an archived project back
+@served('restore-project')
+def restore_project(leader_username, project_title):
+    if find_project_by_title(project_title):
+        raise OperationError("A project with this title already exists. Please use a unique title.")
+    entries = find_archived(title=project_title, leader=leader_username)
+    if not entries:
+        raise OperationError("No archived project with this title that you were leading.")
+    # The most recently archived one, if the title was used more than once
+    project = load_archived(entries[-1]['id'])
+    now = datetime.now().replace(microsecond=0)
+    try:
+        end_time = datetime.fromisoformat(project['end_time']) if project.get('end_time') else None
+    except (TypeError, ValueError):
+        raise OperationError("The archived project has an unreadable end time.")
+    if not end_time or end_time <= now:
+        # An expired project gets a new day, like a new one, so it is not archived again right away
+        project['end_time'] = (now + timedelta(hours=24)).isoformat()
+    # Saved as a new record; its old version belongs to the deleted copy
+    project.pop('version', None)
+    save_record(project, PROJECTS_FILE)
+    after_commit(mark_restored, project['id'])
+    log_action(f"User {leader_username} restored the project {project_title}", 'restore_project', leader_username, project['id'], title=project_title)
+    return project
+
+
+# Function to deactivate a user account
+def deactivate_user(manager_username, username):
+    user = find_user(username, DATA_FILE)
+    if not user:
+        raise OperationError(f"User {username} not found.")
+    if not user['active']:
+        raise OperationError(f"User {username} is already deactivated.")
+    update_record(user['id'], DATA_FILE, lambda user: user.update(active=False))
+    log_action(f"User {username} has been deactivated", 'deactivate_user', manager_username, user=username)
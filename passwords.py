@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import hmac
+import os
+import statistics
+import threading
+import time
+
+# Key derivation used for new password hashes: 'scrypt' or 'pbkdf2'
+HASH_METHOD = os.environ.get('TRELLOMIZE_HASH', 'scrypt')
+# Work factors; every hash stores the ones it was made with, so they can be changed at any time
+SCRYPT_N = int(os.environ.get('TRELLOMIZE_SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.environ.get('TRELLOMIZE_SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('TRELLOMIZE_SCRYPT_P', '1'))
+PBKDF2_ITERATIONS = int(os.environ.get('TRELLOMIZE_PBKDF2_ITERATIONS', '600000'))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def current_params(method=None):
+    """Return the configured work factors for a method."""
+    method = method or HASH_METHOD
+    if method == 'scrypt':
+        return {'method': 'scrypt', 'n': SCRYPT_N, 'r': SCRYPT_R, 'p': SCRYPT_P}
+    if method == 'pbkdf2':
+        return {'method': 'pbkdf2', 'hash_name': 'sha256', 'iterations': PBKDF2_ITERATIONS}
+    raise ValueError(f"Unknown password hash method: {method}")
+
+
+def _derive(password, salt, params):
+    password = password.encode('utf-8')
+    if params['method'] == 'scrypt':
+        n, r, p = params['n'], params['r'], params['p']
+        # scrypt needs about 128 * n * r bytes; allow that plus some headroom
+        return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=KEY_BYTES)
+    if params['method'] == 'pbkdf2':
+        return hashlib.pbkdf2_hmac(params['hash_name'], password, salt, params['iterations'], dklen=KEY_BYTES)
+    raise ValueError(f"Unknown password hash method: {params['method']}")
+
+
+# Function to hash a password with a new random salt
+def hash_password(password, params=None):
+    """Return the hash record stored in place of the password.
+
+    The record is a dict holding the method, its work factors, the salt and
+    the derived key (both base64), so it can be verified after the
+    configured work factors change.
+    """
+    params = dict(params or current_params())
+    salt = os.urandom(SALT_BYTES)
+    params['salt'] = base64.b64encode(salt).decode('utf-8')
+    params['hash'] = base64.b64encode(_derive(password, salt, params)).decode('utf-8')
+    return params
+
+
+# Function to check a password against a stored hash record or an old base64/plaintext password
+def verify_password(password, stored):
+    if isinstance(stored, dict):
+        salt = base64.b64decode(stored['salt'])
+        expected = base64.b64decode(stored['hash'])
+        return hmac.compare_digest(_derive(password, salt, stored), expected)
+    # Records from before hashing hold the password base64 encoded or as plain text
+    stored = str(stored).encode('utf-8')
+    password = password.encode('utf-8')
+    return hmac.compare_digest(stored, base64.b64encode(password)) or hmac.compare_digest(stored, password)
+
+
+# Function to tell whether a stored password should be hashed again with the current settings
+def needs_rehash(stored):
+    if not isinstance(stored, dict):
+        return True
+    params = {key: value for key, value in stored.items() if key not in ('salt', 'hash')}
+    return params != current_params()
+
+
+def benchmark(settings, threads=None, seconds=2.0):
+    """Measure verify latency and throughput for each work factor setting.
+
+    Every setting is verified by `threads` threads at once (hashlib releases
+    the GIL while deriving keys) for about `seconds`, like that many users
+    logging in together. Returns one dict per setting with the median and
+    95th percentile latency in milliseconds and the logins per second.
+    """
+    threads = threads or os.cpu_count() or 1
+    results = []
+    for params in settings:
+        stored = hash_password('benchmark-password', params)
+        latencies = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                verify_password('benchmark-password', stored)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        total = time.perf_counter() - started
+        latencies.sort()
+        results.append({
+            'params': params,
+            'threads': threads,
+            'median_ms': statistics.median(latencies) * 1000,
+            'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+            'logins_per_second': len(latencies) / total,
+        })
+    return results
@@ -0,0 +1,250 @@
+import atexit
+import json
+import os
+import storage
+
+# Path to the projects data file the index is kept for
+PROJECTS_FILE = 'projects.json'
+
+
+class ProjectIndex:
+    """Lookup tables over the projects file, kept current on every write.
+
+    Maps title -> project id, task id -> project id, username -> ids of the
+    projects they lead and username -> ids of the projects they are a member of.
+    The tables are saved to '<file>.idx' together with the storage stamp of the
+    data they describe, so a later session whose data file has not changed
+    loads them instead of scanning every project again. They are rebuilt from
+    the storage manifest; when that does not list tasks, the task table is
+    filled from the full data the first time a task is looked up.
+    """
+
+    def __init__(self, file_path=PROJECTS_FILE):
+        self.file_path = file_path
+        # Resolved now, so the index stays next to its data file if the working directory changes
+        self.index_path = os.path.abspath(file_path) + '.idx'
+        self.stamp = None
+        self.dirty = False
+        self._clear()
+        storage.add_observer(file_path, self.on_change)
+        atexit.register(self.persist)
+
+    def _clear(self):
+        self.tasks_complete = True
+        self.summaries = {}
+        self.titles = {}
+        self.tasks = {}
+        self.led = {}
+        self.joined = {}
+
+    def project_id_by_title(self, title):
+        self.refresh()
+        return self.titles.get(title)
+
+    def project_id_by_task(self, task_id):
+        self.refresh()
+        if task_id not in self.tasks and not self.tasks_complete:
+            self._load_tasks()
+        return self.tasks.get(task_id)
+
+    def project_ids_led_by(self, username):
+        self.refresh()
+        return list(self.led.get(username, ()))
+
+    def project_ids_joined_by(self, username):
+        self.refresh()
+        return list(self.joined.get(username, ()))
+
+    def summary(self, project_id):
+        self.refresh()
+        return dict(self.summaries[project_id], id=project_id)
+
+    def refresh(self):
+        """Make sure the tables describe the current data file."""
+        stamp = storage.get_backend().stamp(self.file_path)
+        if stamp == self.stamp:
+            return
+        if self._load_persisted(stamp):
+            return
+        self.rebuild(storage.load_manifest(self.file_path))
+        self.stamp = stamp
+
+    def rebuild(self, projects):
+        self._clear()
+        for project in projects:
+            self._add(project)
+        self.dirty = True
+
+    def on_change(self, change, payload, stamp_before, stamp_after):
+        if self.stamp != stamp_before or change == 'discard':
+            # Tables are out of date; rebuild on next lookup
+            self.stamp = None
+            return
+        if change == 'flush':
+            pass
+        elif change == 'replace':
+            self.rebuild(payload)
+        elif change == 'save':
+            self._remove(storage.record_key(payload))
+            self._add(payload)
+        else:
+            self._remove(payload)
+        self.stamp = stamp_after
+        self.dirty = True
+
+    def persist(self):
+        if not self.dirty or self.stamp is None:
+            return
+        state = {
+            'stamp': self.stamp,
+            'tasks_complete': self.tasks_complete,
+            'summaries': self.summaries,
+            'titles': self.titles,
+            'tasks': self.tasks,
+            'led': self.led,
+            'joined': self.joined,
+        }
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(state, file)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # The index is only a shortcut; it gets rebuilt from the data when missing
+            return
+        self.dirty = False
+
+    def _load_persisted(self, stamp):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, 'r') as file:
+                state = json.load(file)
+        except json.JSONDecodeError:
+            return False
+        # JSON turns the stamp tuples into lists; compare through a round trip
+        if state.get('stamp') != json.loads(json.dumps(stamp)):
+            return False
+        self.tasks_complete = state['tasks_complete']
+        self.summaries = state['summaries']
+        self.titles = state['titles']
+        self.tasks = state['tasks']
+        self.led = state['led']
+        self.joined = state['joined']
+        self.stamp = stamp
+        self.dirty = False
+        return True
+
+    def _add(self, project):
+        project_id = project['id']
+        summary = {
+            'title': project['title'],
+            'leader': project['leader'],
+            'members': list(project['members']),
+            'tasks': [task['id'] for task in project.get('tasks', [])],
+        }
+        if 'tasks' not in project:
+            self.tasks_complete = False
+        self.summaries[project_id] = summary
+        self.titles[summary['title']] = project_id
+        for task_id in summary['tasks']:
+            self.tasks[task_id] = project_id
+        self.led.setdefault(summary['leader'], []).append(project_id)
+        for member in summary['members']:
+            self.joined.setdefault(member, []).append(project_id)
+
+    def _load_tasks(self):
+        for project in storage.iter_records(self.file_path):
+            summary = self.summaries.get(project['id'])
+            if summary is None:
+                continue
+            summary['tasks'] = [task['id'] for task in project.get('tasks', [])]
+            for task_id in summary['tasks']:
+                self.tasks[task_id] = project['id']
+        self.tasks_complete = True
+        self.dirty = True
+
+    def _remove(self, project_id):
+        summary = self.summaries.pop(project_id, None)
+        if summary is None:
+            return
+        if self.titles.get(summary['title']) == project_id:
+            del self.titles[summary['title']]
+        for task_id in summary['tasks']:
+            if self.tasks.get(task_id) == project_id:
+                del self.tasks[task_id]
+        _discard(self.led, summary['leader'], project_id)
+        for member in summary['members']:
+            _discard(self.joined, member, project_id)
+
+
+def _discard(table, username, project_id):
+    project_ids = table.get(username)
+    if project_ids and project_id in project_ids:
+        project_ids.remove(project_id)
+        if not project_ids:
+            del table[username]
+
+
+_indexes = {}
+
+
+def get_index(file_path=PROJECTS_FILE):
+    """Return the shared index for a projects file."""
+    if file_path not in _indexes:
+        _indexes[file_path] = ProjectIndex(file_path)
+    return _indexes[file_path]
+
+
+# Function to find a project by its title
+def find_project_by_title(title, file_path=PROJECTS_FILE):
+    project_id = get_index(file_path).project_id_by_title(title)
+    return storage.get_record(project_id, file_path) if project_id else None
+
+
+# Function to find the id of a project by its title, without reading the project
+def find_project_id_by_title(title, file_path=PROJECTS_FILE):
+    return get_index(file_path).project_id_by_title(title)
+
+
+# Function to find a task and the project it belongs to by the task id
+def find_task(task_id, file_path=PROJECTS_FILE):
+    project_id = get_index(file_path).project_id_by_task(task_id)
+    if project_id is None:
+        return None, None
+    project = storage.get_record(project_id, file_path)
+    for task in project.get('tasks', []):
+        if task['id'] == task_id:
+            return project, task
+    return project, None
+
+
+# Function to list the projects a user leads
+def projects_led_by(username, file_path=PROJECTS_FILE):
+    return [storage.get_record(project_id, file_path) for project_id in get_index(file_path).project_ids_led_by(username)]
+
+
+# Function to change one task of a project with the freshest copy of the project
+def update_task(project_id, task_id, change, file_path=PROJECTS_FILE):
+    def change_task(project):
+        for task in project.get('tasks', []):
+            if task['id'] == task_id:
+                change(task)
+    return storage.update_record(project_id, file_path, change_task)
+
+
+# Function to list id, title, leader and members of the projects a user leads, without loading them
+def summaries_led_by(username, file_path=PROJECTS_FILE):
+    index = get_index(file_path)
+    return [index.summary(project_id) for project_id in index.project_ids_led_by(username)]
+
+
+# Function to list id, title, leader and members of the projects a user is a member of, without loading them
+def summaries_joined_by(username, file_path=PROJECTS_FILE):
+    index = get_index(file_path)
+    return [index.summary(project_id) for project_id in index.project_ids_joined_by(username)]
+
+
+# Function to list the projects a user is a member of
+def projects_joined_by(username, file_path=PROJECTS_FILE):
+    return [storage.get_record(project_id, file_path) for project_id in get_index(file_path).project_ids_joined_by(username)]
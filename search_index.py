@@ -0,0 +1,274 @@
+import atexit
+import heapq
+import json
+import math
+import os
+import re
+import storage
+from comments import COMMENTS_DIR, read_comments, read_feed
+from project_index import get_index
+
+# Path to the projects data file the index is kept for
+PROJECTS_FILE = 'projects.json'
+# Weight of a word by where it appears in a task
+WEIGHTS = {'description': 3, 'details': 1, 'comment': 1}
+# Hits returned by default
+LIMIT = 20
+
+_WORD = re.compile(r'\w+')
+
+
+def words(text):
+    """Split text into the lowercase words the index is made of."""
+    return _WORD.findall(text.lower()) if text else []
+
+
+def _count(terms, text, weight):
+    for word in words(text):
+        terms[word] = terms.get(word, 0) + weight
+
+
+class SearchIndex:
+    """Inverted index from words to the tasks whose description, details or comments contain them.
+
+    'postings' maps each word to {task id: weight}, the number of times the
+    word appears in the task with description words counting WEIGHTS times.
+    Saving a project only re-indexes the tasks it holds, and comments are
+    followed through the comment feed, reading only the lines added to each
+    task's comment file since the last look. Like the project index, the
+    tables are saved to '<file>.search' with the stamp of the data they
+    describe, so a later session does not scan the projects again.
+    """
+
+    def __init__(self, file_path=PROJECTS_FILE, comments_dir=COMMENTS_DIR):
+        self.file_path = file_path
+        self.comments_dir = comments_dir
+        # Resolved now, so the index stays next to its data file if the working directory changes
+        self.index_path = os.path.abspath(file_path) + '.search'
+        self.stamp = None
+        self.dirty = False
+        self._clear()
+        storage.add_observer(file_path, self.on_change)
+        atexit.register(self.persist)
+
+    def _clear(self):
+        self.postings = {}
+        # task id -> {word: weight} from the task itself, and from its comment file
+        self.task_terms = {}
+        self.comment_terms = {}
+        # task id -> bytes of its comment file already indexed
+        self.comment_offsets = {}
+        self.task_project = {}
+        self.project_tasks = {}
+        self.descriptions = {}
+        self.feed_offset = 0
+
+    def search(self, query, project_ids, limit=LIMIT):
+        """Return (score, task id) of the best tasks in project_ids holding every word of query."""
+        self.refresh()
+        query_words = set(words(query))
+        if not query_words:
+            return []
+        postings = sorted((self.postings.get(word, {}) for word in query_words), key=len)
+        if not postings[0]:
+            return []
+        total = max(len(self.task_terms), 1)
+        # Rarer words count for more
+        rarest, rarest_idf = postings[0], math.log(1 + total / len(postings[0]))
+        others = [(posting, math.log(1 + total / len(posting))) for posting in postings[1:]]
+        task_project = self.task_project
+        scores = []
+        # Only the tasks holding the rarest word need to be looked at
+        for task_id, weight in rarest.items():
+            if task_project.get(task_id) not in project_ids:
+                continue
+            score = weight * rarest_idf
+            for posting, idf in others:
+                weight = posting.get(task_id)
+                if weight is None:
+                    break
+                score += weight * idf
+            else:
+                scores.append((score, task_id))
+        return heapq.nlargest(limit, scores)
+
+    def refresh(self):
+        """Make sure the tables describe the current projects and comments."""
+        stamp = storage.get_backend().stamp(self.file_path)
+        if stamp != self.stamp and not self._load_persisted(stamp):
+            self.rebuild(storage.iter_records(self.file_path))
+            self.stamp = stamp
+        added, offset = read_feed(self.feed_offset, self.comments_dir)
+        if offset != self.feed_offset:
+            self.feed_offset = offset
+            self.dirty = True
+        for project_id, task_id in set(added):
+            if task_id in self.task_project:
+                self._read_comments(task_id)
+
+    def rebuild(self, projects):
+        self._clear()
+        # Comments added while the projects are read are picked up from here on
+        _, self.feed_offset = read_feed(0, self.comments_dir)
+        for project in projects:
+            self._add_project(project)
+        self.dirty = True
+
+    def on_change(self, change, payload, stamp_before, stamp_after):
+        if self.stamp != stamp_before or change == 'discard':
+            # Tables are out of date; rebuild on next search
+            self.stamp = None
+            return
+        if change == 'replace':
+            self.rebuild(payload)
+        elif change == 'save':
+            self._add_project(payload)
+        elif change == 'delete':
+            self._remove_project(payload)
+        self.stamp = stamp_after
+        self.dirty = True
+
+    def _add_project(self, project):
+        project_id = project['id']
+        tasks = project.get('tasks', [])
+        task_ids = [task['id'] for task in tasks]
+        for task_id in set(self.project_tasks.get(project_id, ())) - set(task_ids):
+            self._remove_task(task_id)
+        self.project_tasks[project_id] = task_ids
+        for task in tasks:
+            terms = {}
+            _count(terms, task.get('description'), WEIGHTS['description'])
+            _count(terms, task.get('details'), WEIGHTS['details'])
+            # Comments from before they moved to their own files
+            for comment in task.get('comments') or []:
+                _count(terms, comment.get('content'), WEIGHTS['comment'])
+            task_id = task['id']
+            self.descriptions[task_id] = task.get('description')
+            if self.task_terms.get(task_id) == terms:
+                continue
+            self._unpost(task_id, self.task_terms.get(task_id, {}))
+            self.task_terms[task_id] = terms
+            self._post(task_id, terms)
+            if task_id not in self.task_project:
+                self.task_project[task_id] = project_id
+                # A new or restored task may already have comments
+                self._read_comments(task_id)
+
+    def _remove_project(self, project_id):
+        for task_id in self.project_tasks.pop(project_id, ()):
+            self._remove_task(task_id)
+
+    def _remove_task(self, task_id):
+        self._unpost(task_id, self.task_terms.pop(task_id, {}))
+        self._unpost(task_id, self.comment_terms.pop(task_id, {}))
+        self.comment_offsets.pop(task_id, None)
+        self.task_project.pop(task_id, None)
+        self.descriptions.pop(task_id, None)
+
+    def _read_comments(self, task_id):
+        comments, offset = read_comments(self.task_project[task_id], task_id, self.comment_offsets.get(task_id, 0), self.comments_dir)
+        if not comments:
+            return
+        terms = {}
+        for comment in comments:
+            _count(terms, comment.get('content'), WEIGHTS['comment'])
+        self.comment_offsets[task_id] = offset
+        self._post(task_id, terms)
+        stored = self.comment_terms.setdefault(task_id, {})
+        for word, weight in terms.items():
+            stored[word] = stored.get(word, 0) + weight
+        self.dirty = True
+
+    def _post(self, task_id, terms):
+        for word, weight in terms.items():
+            posting = self.postings.setdefault(word, {})
+            posting[task_id] = posting.get(task_id, 0) + weight
+
+    def _unpost(self, task_id, terms):
+        for word, weight in terms.items():
+            posting = self.postings.get(word)
+            if posting is None or task_id not in posting:
+                continue
+            posting[task_id] -= weight
+            if posting[task_id] <= 0:
+                del posting[task_id]
+                if not posting:
+                    del self.postings[word]
+
+    def persist(self):
+        if not self.dirty or self.stamp is None:
+            return
+        state = {
+            'stamp': self.stamp,
+            'feed_offset': self.feed_offset,
+            'task_terms': self.task_terms,
+            'comment_terms': self.comment_terms,
+            'comment_offsets': self.comment_offsets,
+            'task_project': self.task_project,
+            'project_tasks': self.project_tasks,
+            'descriptions': self.descriptions,
+        }
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(state, file)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # The index is only a shortcut; it gets rebuilt from the data when missing
+            return
+        self.dirty = False
+
+    def _load_persisted(self, stamp):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, 'r') as file:
+                state = json.load(file)
+        except json.JSONDecodeError:
+            return False
+        # JSON turns the stamp tuples into lists; compare through a round trip
+        if state.get('stamp') != json.loads(json.dumps(stamp)):
+            return False
+        self._clear()
+        self.feed_offset = state['feed_offset']
+        self.task_terms = state['task_terms']
+        self.comment_terms = state['comment_terms']
+        self.comment_offsets = state['comment_offsets']
+        self.task_project = state['task_project']
+        self.project_tasks = state['project_tasks']
+        self.descriptions = state['descriptions']
+        # The postings are the two term tables turned around, so they are not saved
+        for terms in (self.task_terms, self.comment_terms):
+            for task_id, task_terms in terms.items():
+                self._post(task_id, task_terms)
+        self.stamp = stamp
+        self.dirty = False
+        return True
+
+
+_indexes = {}
+
+
+def get_search_index(file_path=PROJECTS_FILE):
+    """Return the shared search index for a projects file."""
+    if file_path not in _indexes:
+        _indexes[file_path] = SearchIndex(file_path)
+    return _indexes[file_path]
+
+
+# Function to search the tasks of the projects a user leads or is a member of
+def search_tasks(username, query, limit=LIMIT, file_path=PROJECTS_FILE):
+    """Return the best matching tasks the user can see, best first."""
+    projects = get_index(file_path)
+    visible = set(projects.project_ids_led_by(username)) | set(projects.project_ids_joined_by(username))
+    index = get_search_index(file_path)
+    hits = []
+    for score, task_id in index.search(query, visible, limit):
+        project_id = index.task_project[task_id]
+        hits.append({
+            'project': projects.summary(project_id)['title'],
+            'task': task_id,
+            'description': index.descriptions.get(task_id),
+            'score': round(score, 3),
+        })
+    return hits
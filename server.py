@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import secrets
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import parse_qsl, unquote, urlsplit
+from loguru import logger
+import storage
+import api_client
+import expiry
+from api_client import ROUTES, LOGIN_PATH, LOGOUT_PATH
+from cli import run_command
+from operations import OperationError, transaction
+from user_index import find_user
+from passwords import verify_password
+from models import encode
+from log_export import start_exporter
+
+# Seconds between two writes of the data files; 0 writes after every change
+FLUSH_INTERVAL = float(os.environ.get('TRELLOMIZE_SERVER_FLUSH', '0.5'))
+# Longest wait in seconds between two checks for expired projects and tasks
+EXPIRY_INTERVAL = float(os.environ.get('TRELLOMIZE_SERVER_EXPIRY', '1'))
+# Largest request body accepted, in bytes
+MAX_BODY = 1024 * 1024
+# Seconds a session token stays valid after login
+SESSION_TTL = float(os.environ.get('TRELLOMIZE_SESSION_TTL', str(8 * 3600)))
+# Threads that check login passwords, apart from the data worker
+LOGIN_THREADS = int(os.environ.get('TRELLOMIZE_LOGIN_THREADS', str(os.cpu_count() or 4)))
+
+# Same answer for an unknown user and a wrong password
+BAD_LOGIN = (401, {'error': 'Invalid username or password.'})
+
+REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def _compile_routes():
+    routes = []
+    for command, (method, path, _) in ROUTES.items():
+        pattern = re.sub(r'\{(\w+)\}', r'(?P<\1>[^/]+)', path)
+        routes.append((method, re.compile(pattern + '$'), command))
+    return routes
+
+
+class ApiServer:
+    """HTTP/JSON server that owns the data and is its only writer.
+
+    Requests are handled one at a time against the data cached in memory,
+    inside a transaction, so a response never waits for the disk. Every
+    FLUSH_INTERVAL seconds the transaction is committed, which writes each
+    changed data file once and then their log entries, and a new one is
+    opened. All of this runs on one worker thread, so the event loop keeps
+    reading requests while the files are written, and the file locks a
+    transaction takes are released by the thread that took them.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, expiry_interval=EXPIRY_INTERVAL):
+        self.flush_interval = flush_interval
+        self.expiry_interval = expiry_interval
+        self.scheduler = expiry.get_scheduler(expiry.PROJECTS_FILE)
+        self.routes = _compile_routes()
+        self.pending = None
+        self.changes = 0
+        self.requests = 0
+        self.worker = None
+        self.hasher = None
+        # Session token -> (username, time it stops being valid)
+        self.sessions = {}
+
+    def handle(self, method, target, body, token=None):
+        """Run one request and return (status, response object).
+
+        Every request but the login needs the token the login returned, and
+        runs as the user the token was given to; a 'user' in the request is
+        ignored.
+        """
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        if body is not None and not isinstance(body, dict):
+            return 400, {'error': 'Request body must be a JSON object'}
+        if path in (LOGIN_PATH, LOGOUT_PATH):
+            if method != 'POST':
+                return 405, {'error': f"Method {method} not allowed on {path}"}
+            if path == LOGIN_PATH:
+                return self.login(body or {})
+            self.sessions.pop(token, None)
+            return 200, {'result': None}
+        allowed = False
+        for route_method, pattern, command in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            arguments = dict(parse_qsl(url.query))
+            if isinstance(body, dict):
+                arguments.update(body)
+            arguments.update({name: unquote(value) for name, value in match.groupdict().items()})
+            username = self.session_user(token)
+            if username is None:
+                return 401, {'error': 'Please log in first.'}
+            arguments['user'] = username
+            self.requests += 1
+            try:
+                result = self.run(command, method, arguments)
+            except OperationError as e:
+                return 400, {'error': str(e)}
+            return 200, {'result': result}
+        if allowed:
+            return 405, {'error': f"Method {method} not allowed on {path}"}
+        return 404, {'error': f"No such resource: {path}"}
+
+    def login(self, body):
+        failure, user = self.login_user(body)
+        if failure:
+            return failure
+        if not verify_password(body['password'], user['password']):
+            return BAD_LOGIN
+        return self.start_session(user)
+
+    async def serve_login(self, body):
+        """Log in like login(), with the password checked on the login threads.
+
+        Hashing a password takes tens of milliseconds; on the data worker it
+        would hold up every other request for that long.
+        """
+        failure, user = await self.call(self.login_user, body)
+        if failure:
+            return failure
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(self.hasher, verify_password, body['password'], user['password']):
+            return BAD_LOGIN
+        return await self.call(self.start_session, user)
+
+    def login_user(self, body):
+        # Return (error response, None), or (None, user record) when the password is still to be checked
+        username, password = body.get('user'), body.get('password')
+        if not isinstance(username, str) or not isinstance(password, str):
+            return (400, {'error': 'The user and password arguments are required.'}), None
+        user = find_user(username)
+        if not user:
+            return BAD_LOGIN, None
+        return None, user
+
+    def start_session(self, user):
+        if not user['active']:
+            return 401, {'error': 'Your account is inactive. Please contact the administrator.'}
+        token = secrets.token_urlsafe(32)
+        self.sessions[token] = (user['username'], time.time() + SESSION_TTL)
+        return 200, {'result': {'token': token}}
+
+    def session_user(self, token):
+        """Return the user a session token was given to, or None if it is unknown, too old or deactivated."""
+        username, expires = self.sessions.get(token, (None, 0))
+        if username is None or expires < time.time():
+            self.sessions.pop(token, None)
+            return None
+        # Read again on every request: another session may have deactivated or removed the user
+        user = find_user(username)
+        if not user or not user['active']:
+            self.end_sessions(username)
+            return None
+        return username
+
+    def end_sessions(self, username):
+        for token in [token for token, (owner, _) in self.sessions.items() if owner == username]:
+            del self.sessions[token]
+
+    def run(self, command, method, arguments):
+        if method == 'GET':
+            return run_command(command, arguments)
+        self.begin()
+        result = run_command(command, arguments)
+        self.changes += 1
+        if self.flush_interval <= 0:
+            self.flush()
+        return result
+
+    def begin(self):
+        if self.pending is None:
+            self.pending = ExitStack()
+            self.pending.enter_context(transaction())
+
+    def flush(self):
+        """Write the changes made since the last flush."""
+        if self.pending is not None:
+            pending, self.pending = self.pending, None
+            pending.close()
+
+    async def call(self, function, *args):
+        # Run on the worker thread that owns the data
+        return await asyncio.get_running_loop().run_in_executor(self.worker, function, *args)
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.call(self.flush)
+            except Exception:
+                # Keep flushing; the next interval tries again with the later changes
+                logger.exception("Writing the data files failed")
+
+    def expire(self):
+        """Expire the projects and tasks that are due, like any other change."""
+        self.begin()
+        self.changes += self.scheduler.run_due()
+        if self.flush_interval <= 0:
+            self.flush()
+
+    async def expire_periodically(self):
+        while True:
+            try:
+                await self.call(self.expire)
+            except Exception:
+                logger.exception("Expiring projects and tasks failed")
+            # Sleep until the next end time, but wake up now and then to see new ones
+            next_due = self.scheduler.next_due()
+            delay = self.expiry_interval if next_due is None else next_due - time.time()
+            await asyncio.sleep(min(max(delay, 0), self.expiry_interval))
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'Malformed request line'}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # The body cannot be told apart from the next request; give up on the connection
+                    await self.respond(writer, 400, {'error': 'Invalid Content-Length'}, False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': 'Request body too large'}, False)
+                    break
+                body = None
+                if length:
+                    try:
+                        body = json.loads(await reader.readexactly(length))
+                    except ValueError:
+                        await self.respond(writer, 400, {'error': 'Request body is not valid JSON'}, keep_alive)
+                        continue
+                try:
+                    scheme, _, token = headers.get('authorization', '').partition(' ')
+                    token = token.strip() if scheme.lower() == 'bearer' else None
+                    if method == 'POST' and urlsplit(target).path.rstrip('/') == LOGIN_PATH and isinstance(body, dict):
+                        status, response = await self.serve_login(body)
+                    else:
+                        status, response = await self.call(self.handle, method, target, body, token)
+                except Exception:
+                    # The details go to the server log only; they may show paths and data
+                    logger.exception(f"Request {method} {target} failed")
+                    status, response = 500, {'error': 'Internal server error'}
+                await self.respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # Client went away, or the server is shutting down
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, response, keep_alive):
+        payload = json.dumps(response, default=encode).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def serve(self, host, port, ready=None):
+        self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trellomize-data')
+        self.hasher = ThreadPoolExecutor(max_workers=LOGIN_THREADS, thread_name_prefix='trellomize-login')
+        server = await asyncio.start_server(self.serve_client, host, port, backlog=1024)
+        flusher = asyncio.create_task(self.flush_periodically()) if self.flush_interval > 0 else None
+        expirer = asyncio.create_task(self.expire_periodically())
+        try:
+            # Stop cleanly on SIGTERM so the last changes are written
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, AttributeError):
+            pass
+        if ready is not None:
+            ready(server.sockets[0].getsockname())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if flusher:
+                flusher.cancel()
+            expirer.cancel()
+            await self.call(self.flush)
+            self.worker.shutdown()
+            self.hasher.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the project and task operations over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    args = parser.parse_args(argv)
+
+    # This process is the server; never forward operations to another one
+    api_client.SERVER_URL = None
+    start_exporter()
+    print(f"Serving on http://{args.host}:{args.port} (data written every {FLUSH_INTERVAL} s)")
+    try:
+        asyncio.run(ApiServer().serve(args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    stats = storage.write_stats()
+    print(f"Server stopped. {stats['written']} records written in {stats['files']} file writes; {stats['skipped']} unchanged writes skipped.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import storage
+from user_index import DATA_FILE, find_user
+
+# Logged-in users of this process by username
+_sessions = {}
+# Users files whose writes the sessions follow
+_observed = set()
+
+
+def _on_users_change(change, payload, stamp_before, stamp_after):
+    # Keep cached sessions in step with writes made by this process
+    if change == 'save' and payload.get('username') in _sessions:
+        _sessions[payload['username']] = payload
+    elif change in ('delete', 'replace', 'discard'):
+        _sessions.clear()
+
+
+# Function to remember a logged-in user for the rest of the process
+def start_session(user, file_path=DATA_FILE):
+    if file_path not in _observed:
+        storage.add_observer(file_path, _on_users_change)
+        _observed.add(file_path)
+    _sessions[user['username']] = user
+    return user
+
+
+# Function to get the user record of a session, looking it up once if there is none yet
+def get_session_user(username, file_path=DATA_FILE):
+    user = _sessions.get(username)
+    if user is None:
+        user = find_user(username, file_path)
+        if user is not None:
+            start_session(user, file_path)
+    return user
+
+
+# Function to end the session of a user
+def end_session(username):
+    _sessions.pop(username, None)
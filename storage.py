@@ -0,0 +1,1191 @@
+import atexit
+import codecs
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
+from models import encode, to_model, to_models
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; msvcrt.locking gives the same exclusive lock on a byte range
+    fcntl = None
+    import msvcrt
+
+# Faster JSON and a binary format, used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Storage engine used by load_data/save_data: 'json' (default), 'journal', 'sharded' or 'sqlite'
+STORAGE_BACKEND = os.environ.get('TRELLOMIZE_STORAGE', 'json')
+# Format data files are written in: 'json' (indented, default), 'compact' (JSON without
+# whitespace), 'orjson' (compact JSON through orjson when installed) or 'msgpack'. Files are
+# recognised by their content when read, so a file changes format the next time it is saved.
+DATA_FORMAT = os.environ.get('TRELLOMIZE_FORMAT', 'json')
+FORMATS = ('json', 'compact', 'orjson', 'msgpack')
+# Database file used by the sqlite backend
+SQLITE_FILE = os.environ.get('TRELLOMIZE_DB', 'trellomize.db')
+# Number of journal entries after which the journal backend compacts into a new snapshot
+JOURNAL_COMPACT_THRESHOLD = int(os.environ.get('TRELLOMIZE_JOURNAL_COMPACT', '500'))
+# How many times update_record re-applies a change after a conflicting write
+UPDATE_RETRIES = 5
+# When writes are forced to disk: 'write' (before every write returns), 'batch' (once at the
+# end of each batch or transaction) or 'interval' (every TRELLOMIZE_SYNC_INTERVAL seconds)
+DURABILITY = os.environ.get('TRELLOMIZE_DURABILITY', 'write')
+SYNC_INTERVAL = float(os.environ.get('TRELLOMIZE_SYNC_INTERVAL', '1'))
+
+
+class ConflictError(Exception):
+    """Raised when a record was changed by another session since it was read."""
+
+
+# Locks held by this process: file path -> [threading.RLock, depth, open lock file]
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(file_path):
+    """Hold an exclusive advisory lock on file_path across processes.
+
+    The lock lives in '<file>.lock' and is re-entrant within a process, so
+    update_record can hold it around a read-modify-write that ends in save_record.
+    """
+    with _locks_guard:
+        state = _locks.setdefault(file_path, [threading.RLock(), 0, None])
+    state[0].acquire()
+    try:
+        if state[1] == 0:
+            lock_file = open(file_path + '.lock', 'a+')
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            state[2] = lock_file
+        state[1] += 1
+        try:
+            yield
+        finally:
+            state[1] -= 1
+            if state[1] == 0:
+                lock_file = state[2]
+                state[2] = None
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+                lock_file.close()
+    finally:
+        state[0].release()
+
+
+def record_key(record):
+    """Return the key a record is stored under (its id, or username for old user records)."""
+    return record.get('id') or record.get('username')
+
+
+def _put(data, record):
+    # Replace the record with the same key in data, or append it
+    key = record_key(record)
+    for index, existing in enumerate(data):
+        if record_key(existing) == key:
+            data[index] = record
+            return
+    data.append(record)
+
+
+# Files written but not forced to disk yet, under the 'batch' and 'interval' durability
+_unsynced = set()
+_unsynced_guard = threading.Lock()
+_sync_thread = None
+
+
+def _sync_now():
+    # Writes outside a batch are their own commit under 'batch'
+    return DURABILITY == 'write' or (DURABILITY == 'batch' and _batch is None)
+
+
+def _fsync_dir(directory):
+    # Make a rename in the directory durable; Windows has no directory handles for this
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _sync_later(file_path):
+    global _sync_thread
+    with _unsynced_guard:
+        _unsynced.add(file_path)
+        if DURABILITY == 'interval' and _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_periodically, daemon=True)
+            _sync_thread.start()
+
+
+def _sync_periodically():
+    while True:
+        time.sleep(SYNC_INTERVAL)
+        sync()
+
+
+def sync():
+    """Force the files written since the last sync to disk."""
+    with _unsynced_guard:
+        paths = list(_unsynced)
+        _unsynced.clear()
+    directories = set()
+    for path in paths:
+        try:
+            with open(path, 'ab') as file:
+                os.fsync(file.fileno())
+        except FileNotFoundError:
+            continue
+        directories.add(os.path.dirname(os.path.abspath(path)))
+    for directory in directories:
+        _fsync_dir(directory)
+
+
+atexit.register(sync)
+
+
+def dump_bytes(data, data_format=None, indent=None):
+    """Serialize data in a data file format; indent only applies to 'json'."""
+    data_format = data_format or DATA_FORMAT
+    if data_format == 'json':
+        return json.dumps(data, indent=indent, default=encode).encode('utf-8')
+    if data_format == 'orjson' and orjson is not None:
+        return orjson.dumps(data, default=encode)
+    if data_format in ('compact', 'orjson'):
+        return json.dumps(data, separators=(',', ':'), default=encode).encode('utf-8')
+    if data_format == 'msgpack':
+        if msgpack is None:
+            raise ValueError("The msgpack format needs the msgpack package (pip install msgpack).")
+        return msgpack.packb(data, default=encode, use_bin_type=True)
+    raise ValueError(f"Unknown data format: {data_format}")
+
+
+def load_bytes(raw):
+    """Decode the content of a data file in whichever format it was written."""
+    start = raw.lstrip()[:1]
+    if not start:
+        return []
+    if start in (b'[', b'{'):
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
+    if msgpack is None:
+        raise ValueError("This data file is in msgpack format; install the msgpack package to read it.")
+    return msgpack.unpackb(raw, raw=False)
+
+
+def read_data_file(file_path, default=None):
+    """Return the decoded content of a data file, or default if it does not exist."""
+    try:
+        with open(file_path, 'rb') as file:
+            return load_bytes(file.read())
+    except FileNotFoundError:
+        return default
+
+
+# Bytes of a data file decoded at a time by scan_records
+SCAN_CHUNK = 1024 * 1024
+_SEPARATORS = re.compile(rb'[\s,]*')
+_TEXT_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def scan_records(buffer, chunk_size=SCAN_CHUNK):
+    """Yield the records of a JSON list one at a time from a bytes-like buffer.
+
+    The buffer is decoded a chunk at a time and each record is parsed with
+    raw_decode as soon as the text holds all of it, so memory stays at one
+    chunk plus one record whatever the size of the file.
+    """
+    decode = json.JSONDecoder().raw_decode
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    text, position, offset, started = '', 0, 0, False
+    while True:
+        position = _TEXT_SEPARATORS.match(text, position).end()
+        if position < len(text):
+            if not started:
+                if text[position] != '[':
+                    raise ValueError("Data file is not a JSON list")
+                started = True
+                position += 1
+                continue
+            if text[position] == ']':
+                return
+            try:
+                # Records are objects, so a record that decodes is complete
+                record, position = decode(text, position)
+            except ValueError:
+                if offset >= len(buffer):
+                    raise
+            else:
+                yield record
+                continue
+        elif offset >= len(buffer):
+            if started:
+                raise ValueError("Data file ends before its closing bracket")
+            return
+        # Read on; at least as much as is pending, so a large record is not parsed over and over
+        size = max(chunk_size, len(text) - position)
+        chunk = buffer[offset:offset + size]
+        offset += len(chunk)
+        text = text[position:] + utf8.decode(chunk, final=offset >= len(buffer))
+        position = 0
+
+
+def iter_data_file(file_path):
+    """Yield the records of a data file one at a time, reading it through mmap.
+
+    Files in a non-JSON format are decoded whole. The file is replaced by
+    rename when written, so the mapping keeps showing the content it was
+    opened with even if another session saves meanwhile. Windows cannot
+    rename over an open file, so there the bytes are read and the file
+    closed first; records are still decoded one at a time.
+    """
+    try:
+        file = open(file_path, 'rb')
+    except FileNotFoundError:
+        return
+    with file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        if fcntl is None:
+            buffer = file.read()
+        else:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    with buffer if isinstance(buffer, mmap.mmap) else nullcontext(buffer):
+        start = _SEPARATORS.match(buffer, 0).end()
+        if buffer[start:start + 1] not in (b'[', b''):
+            yield from load_bytes(buffer[:])
+            return
+        yield from scan_records(buffer)
+
+
+def write_json_atomic(data, file_path, indent=None):
+    """Write data to a temporary file and rename it over file_path.
+
+    The file is replaced in one step, so a crash or Ctrl-C halfway through
+    leaves the previous content. Under the 'write' durability the new
+    content is on disk before this returns; otherwise sync() forces it later.
+    """
+    tmp_path = file_path + '.tmp'
+    sync_now = _sync_now()
+    content = dump_bytes(data, indent=indent)
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(content)
+            if sync_now:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if sync_now:
+        _fsync_dir(os.path.dirname(os.path.abspath(file_path)))
+    else:
+        _sync_later(file_path)
+
+
+def table_name(file_path):
+    """Map a data file such as 'projects.json' to a table name such as 'projects'."""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return re.sub(r'\W', '_', name)
+
+
+def file_stamp(file_path):
+    """Return (mtime, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class JsonBackend:
+    """Keep each data file as one JSON list, rewritten on every save."""
+
+    # Reading any record means parsing the whole file
+    whole_file = True
+
+    def stamp(self, file_path):
+        return file_stamp(file_path)
+
+    def load(self, file_path):
+        return read_data_file(file_path, [])
+
+    def iter_records(self, file_path):
+        return iter_data_file(file_path)
+
+    def save(self, data, file_path):
+        write_json_atomic(data, file_path, indent=4)
+
+    def get_record(self, record_id, file_path):
+        for record in self.iter_records(file_path):
+            if record_key(record) == record_id:
+                return record
+        return None
+
+    def save_record(self, record, file_path, loaded=None):
+        # 'loaded' is the current content of file_path if the caller already has it parsed
+        data = list(loaded) if loaded is not None else self.load(file_path)
+        _put(data, record)
+        self.save(data, file_path)
+
+    def delete_record(self, record_id, file_path, loaded=None):
+        data = loaded if loaded is not None else self.load(file_path)
+        remaining = [record for record in data if record_key(record) != record_id]
+        if len(remaining) != len(data):
+            self.save(remaining, file_path)
+
+
+class JournalBackend:
+    """Keep a JSON snapshot plus an append-only journal of record changes.
+
+    Each save_record/delete_record appends one line to '<file>.journal'. Loading
+    replays the journal over the snapshot, and once the journal grows past
+    JOURNAL_COMPACT_THRESHOLD entries it is folded into a fresh snapshot on a
+    background thread. Journal entries carry whole records, so replaying an entry
+    that is already part of the snapshot is harmless; this is what makes recovery
+    after a crash between writing the snapshot and removing the journal safe.
+    """
+
+    whole_file = True
+
+    def __init__(self, compact_threshold=None):
+        self.compact_threshold = compact_threshold or JOURNAL_COMPACT_THRESHOLD
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._compactions = {}
+        atexit.register(self.wait_for_compaction)
+
+    def journal_path(self, file_path):
+        return file_path + '.journal'
+
+    def stamp(self, file_path):
+        return (file_stamp(file_path), file_stamp(self.journal_path(file_path)))
+
+    def load(self, file_path):
+        data = JsonBackend().load(file_path)
+        with self._lock:
+            entries = self._read_journal(file_path)
+            self._entries[file_path] = len(entries)
+        if not entries:
+            return data
+        records = {record_key(record): record for record in data}
+        for entry in entries:
+            if entry['op'] == 'put':
+                records[record_key(entry['record'])] = entry['record']
+            else:
+                records.pop(entry['id'], None)
+        return list(records.values())
+
+    def save(self, data, file_path):
+        with file_lock(file_path), self._lock:
+            self._write_snapshot(data, file_path)
+            if os.path.exists(self.journal_path(file_path)):
+                os.remove(self.journal_path(file_path))
+            self._entries[file_path] = 0
+
+    def get_record(self, record_id, file_path):
+        for record in self.load(file_path):
+            if record_key(record) == record_id:
+                return record
+        return None
+
+    def save_record(self, record, file_path, loaded=None):
+        self._append({'op': 'put', 'record': record}, file_path)
+
+    def delete_record(self, record_id, file_path, loaded=None):
+        self._append({'op': 'delete', 'id': record_id}, file_path)
+
+    def compact(self, file_path):
+        """Fold the journal into a new snapshot."""
+        # Appends take the same lock, so nothing can be added between the load and the save
+        with file_lock(file_path):
+            self.save(self.load(file_path), file_path)
+
+    def wait_for_compaction(self, file_path=None):
+        paths = [file_path] if file_path else list(self._compactions)
+        for path in paths:
+            thread = self._compactions.pop(path, None)
+            if thread is not None:
+                thread.join()
+
+    def _append(self, entry, file_path):
+        if file_path not in self._entries:
+            self.load(file_path)
+        with file_lock(file_path), self._lock:
+            sync_now = _sync_now()
+            with open(self.journal_path(file_path), 'a') as journal:
+                journal.write(json.dumps(entry, default=encode) + '\n')
+                if sync_now:
+                    journal.flush()
+                    os.fsync(journal.fileno())
+            if not sync_now:
+                _sync_later(self.journal_path(file_path))
+            self._entries[file_path] += 1
+            due = self._entries[file_path] >= self.compact_threshold
+        running = self._compactions.get(file_path)
+        if due and (running is None or not running.is_alive()):
+            thread = threading.Thread(target=self.compact, args=(file_path,), daemon=True)
+            self._compactions[file_path] = thread
+            thread.start()
+
+    def _read_journal(self, file_path):
+        journal_path = self.journal_path(file_path)
+        if not os.path.exists(journal_path):
+            return []
+        entries = []
+        good_size = 0
+        with open(journal_path, 'rb') as journal:
+            for line in journal:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+                good_size += len(line)
+        if good_size < os.path.getsize(journal_path):
+            # A torn last line from a crash mid-append; drop it so new entries are not appended after it
+            os.truncate(journal_path, good_size)
+        return entries
+
+    def _write_snapshot(self, data, file_path):
+        write_json_atomic(data, file_path, indent=4)
+
+
+class ShardedBackend:
+    """Keep every record in its own file plus a manifest of the fields menus list.
+
+    'projects.json' becomes the directory 'projects.shards/' holding '<id>.json'
+    per project and 'manifest.json' with the MANIFEST_FIELDS of every project.
+    Saving one record rewrites its shard, and the manifest only when one of the
+    listed fields changed. '.stamp' holds a counter that is bumped on every
+    write, so other sessions notice changes without reading the shards, even
+    two writes within one tick of the file clock.
+    """
+
+    MANIFEST_FIELDS = ('id', 'username', 'title', 'leader', 'members', 'end_time')
+    whole_file = False
+
+    def __init__(self):
+        # Manifests changed inside group(), written when it ends
+        self._manifests = None
+
+    @contextmanager
+    def group(self):
+        """Write each changed manifest once for all the saves made in the block."""
+        self._manifests = {}
+        try:
+            yield
+        finally:
+            manifests, self._manifests = self._manifests, None
+            for file_path, manifest in manifests.items():
+                if manifest is None:
+                    self._touch(file_path)
+                else:
+                    self._write_manifest(manifest, file_path)
+
+    def shard_dir(self, file_path):
+        return os.path.splitext(file_path)[0] + '.shards'
+
+    def shard_path(self, record_id, file_path):
+        return os.path.join(self.shard_dir(file_path), re.sub(r'[^\w.-]', '_', record_id) + '.json')
+
+    def manifest_path(self, file_path):
+        return os.path.join(self.shard_dir(file_path), 'manifest.json')
+
+    def stamp(self, file_path):
+        stamp_path = os.path.join(self.shard_dir(file_path), '.stamp')
+        stamp = file_stamp(stamp_path)
+        if stamp is None:
+            return None
+        return (self._read_counter(stamp_path), stamp[0])
+
+    def _read_counter(self, stamp_path):
+        try:
+            with open(stamp_path, 'r') as file:
+                return int(file.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def load_manifest(self, file_path):
+        if self._manifests is not None and self._manifests.get(file_path) is not None:
+            return self._manifests[file_path]
+        return read_data_file(self.manifest_path(file_path), [])
+
+    def load(self, file_path):
+        return list(self.iter_records(file_path))
+
+    def iter_records(self, file_path):
+        for entry in self.load_manifest(file_path):
+            record = self.get_record(record_key(entry), file_path)
+            if record is not None:
+                yield record
+
+    def save(self, data, file_path):
+        os.makedirs(self.shard_dir(file_path), exist_ok=True)
+        keep = set()
+        for record in data:
+            write_json_atomic(record, self.shard_path(record_key(record), file_path), indent=4)
+            keep.add(record_key(record))
+        for entry in self.load_manifest(file_path):
+            if record_key(entry) not in keep:
+                self._remove_shard(record_key(entry), file_path)
+        self._write_manifest([self.summary(record) for record in data], file_path)
+
+    def get_record(self, record_id, file_path):
+        return read_data_file(self.shard_path(record_id, file_path))
+
+    def save_record(self, record, file_path, loaded=None):
+        os.makedirs(self.shard_dir(file_path), exist_ok=True)
+        write_json_atomic(record, self.shard_path(record_key(record), file_path), indent=4)
+        manifest = self.load_manifest(file_path)
+        summary = self.summary(record)
+        if summary not in manifest:
+            _put(manifest, summary)
+            self._write_manifest(manifest, file_path)
+        else:
+            self._touch(file_path)
+
+    def delete_record(self, record_id, file_path, loaded=None):
+        self._remove_shard(record_id, file_path)
+        manifest = self.load_manifest(file_path)
+        remaining = [entry for entry in manifest if record_key(entry) != record_id]
+        if len(remaining) != len(manifest):
+            self._write_manifest(remaining, file_path)
+
+    def summary(self, record):
+        return {field: record[field] for field in self.MANIFEST_FIELDS if field in record}
+
+    def _remove_shard(self, record_id, file_path):
+        shard_path = self.shard_path(record_id, file_path)
+        if os.path.exists(shard_path):
+            os.remove(shard_path)
+
+    def _write_manifest(self, manifest, file_path):
+        if self._manifests is not None:
+            self._manifests[file_path] = manifest
+            return
+        write_json_atomic(manifest, self.manifest_path(file_path), indent=4)
+        self._touch(file_path)
+
+    def _touch(self, file_path):
+        if self._manifests is not None:
+            self._manifests.setdefault(file_path, None)
+            return
+        # Writers hold the file lock, so the read and the write of the counter cannot interleave
+        stamp_path = os.path.join(self.shard_dir(file_path), '.stamp')
+        counter = self._read_counter(stamp_path) + 1
+        with open(stamp_path, 'w') as file:
+            file.write(str(counter))
+
+
+class SqliteBackend:
+    """Keep each data file as a table with one row per record, so saves touch only changed rows."""
+
+    whole_file = False
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or SQLITE_FILE
+        self._connection = None
+        self._tables = set()
+        self._grouped = False
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            # FULL syncs the log on every commit; NORMAL leaves it to checkpoints, which survives crashes of the process
+            self._connection.execute('PRAGMA synchronous=' + ('FULL' if DURABILITY == 'write' else 'NORMAL'))
+        return self._connection
+
+    @contextmanager
+    def group(self):
+        """Commit every save made in the block as one transaction."""
+        connection = self._connect()
+        self._grouped = True
+        try:
+            with connection:
+                yield
+        finally:
+            self._grouped = False
+
+    def _commit(self):
+        # Inside group() the group commits; otherwise each write commits on its own
+        return nullcontext() if self._grouped else self._connect()
+
+    def _table(self, file_path):
+        name = table_name(file_path)
+        if name not in self._tables:
+            connection = self._connect()
+            with connection:
+                connection.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (id TEXT PRIMARY KEY, body TEXT NOT NULL)')
+            self._tables.add(name)
+        return name
+
+    def stamp(self, file_path):
+        # Every commit touches the database file or its write-ahead log
+        return (file_stamp(self.db_path), file_stamp(self.db_path + '-wal'))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            self._tables.clear()
+
+    def load(self, file_path):
+        name = self._table(file_path)
+        rows = self._connect().execute(f'SELECT body FROM "{name}" ORDER BY rowid')
+        return [json.loads(body) for (body,) in rows]
+
+    def iter_records(self, file_path):
+        name = self._table(file_path)
+        for (body,) in self._connect().execute(f'SELECT body FROM "{name}" ORDER BY rowid'):
+            yield json.loads(body)
+
+    def save(self, data, file_path):
+        name = self._table(file_path)
+        connection = self._connect()
+        stored = dict(connection.execute(f'SELECT id, body FROM "{name}"'))
+        keep = set()
+        with connection:
+            for record in data:
+                key = record_key(record)
+                body = json.dumps(record, default=encode)
+                keep.add(key)
+                if stored.get(key) != body:
+                    self._upsert(connection, name, key, body)
+            removed = [(key,) for key in stored if key not in keep]
+            if removed:
+                connection.executemany(f'DELETE FROM "{name}" WHERE id = ?', removed)
+
+    def get_record(self, record_id, file_path):
+        name = self._table(file_path)
+        row = self._connect().execute(f'SELECT body FROM "{name}" WHERE id = ?', (record_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_record(self, record, file_path, loaded=None):
+        name = self._table(file_path)
+        connection = self._connect()
+        with self._commit():
+            self._upsert(connection, name, record_key(record), json.dumps(record, default=encode))
+
+    def delete_record(self, record_id, file_path, loaded=None):
+        name = self._table(file_path)
+        connection = self._connect()
+        with self._commit():
+            connection.execute(f'DELETE FROM "{name}" WHERE id = ?', (record_id,))
+
+    def _upsert(self, connection, name, key, body):
+        connection.execute(
+            f'INSERT INTO "{name}" (id, body) VALUES (?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET body = excluded.body',
+            (key, body)
+        )
+
+
+BACKENDS = {
+    'json': JsonBackend,
+    'journal': JournalBackend,
+    'sharded': ShardedBackend,
+    'sqlite': SqliteBackend,
+}
+
+_backend = None
+
+
+def get_backend():
+    """Return the configured storage backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+        _backend = BACKENDS[STORAGE_BACKEND]()
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the storage backend used by the module-level functions."""
+    global _backend
+    _backend = backend
+    clear_cache()
+
+
+# Parsed data shared by every module, keyed by file path
+_cache = {}
+_cache_stats = {'hits': 0, 'misses': 0}
+# Records written ('written'), writes skipped because nothing changed ('skipped'), and physical file writes ('files')
+_write_stats = {'written': 0, 'skipped': 0, 'files': 0}
+# Callbacks notified after each write, keyed by file path
+_observers = {}
+# Writes held back by an active batch()
+_batch = None
+
+
+class _CacheEntry:
+    """Records of one data file plus the position of each record key."""
+
+    def __init__(self, stamp, data):
+        self.stamp = stamp
+        self.data = data
+        self.positions = {record_key(record): index for index, record in enumerate(data)}
+
+    def get(self, key):
+        index = self.positions.get(key)
+        return self.data[index] if index is not None else None
+
+    def put(self, record):
+        key = record_key(record)
+        index = self.positions.get(key)
+        if index is None:
+            self.positions[key] = len(self.data)
+            self.data.append(record)
+        else:
+            self.data[index] = record
+
+    def delete(self, key):
+        if key in self.positions:
+            self.data[:] = [record for record in self.data if record_key(record) != key]
+            self.positions = {record_key(record): index for index, record in enumerate(self.data)}
+
+
+def cache_stats():
+    """Return how often load_data was served from memory ('hits') or from disk ('misses')."""
+    return dict(_cache_stats)
+
+
+def write_stats():
+    """Return how many record writes were performed and skipped as unchanged, and how many file writes they took."""
+    return dict(_write_stats)
+
+
+def clear_cache():
+    _cache.clear()
+    _cache_stats['hits'] = 0
+    _cache_stats['misses'] = 0
+
+
+def add_observer(file_path, callback):
+    """Call callback(change, payload, stamp_before, stamp_after) after every write to file_path.
+
+    change is 'save' (payload is the record), 'delete' (payload is the record id),
+    'replace' (payload is the whole new list of records), 'flush' (a batch wrote
+    the changes already reported) or 'discard' (a batch dropped them).
+    """
+    _observers.setdefault(file_path, []).append(callback)
+
+
+def _notify(file_path, change, payload, stamp_before, stamp_after):
+    for callback in _observers.get(file_path, []):
+        callback(change, payload, stamp_before, stamp_after)
+
+
+def _cached(file_path, backend):
+    # Return the cache entry if it still matches what is on disk, else None
+    entry = _cache.get(file_path)
+    if entry is not None and entry.stamp == backend.stamp(file_path):
+        return entry
+    return None
+
+
+class _Batch:
+    """Files touched by a batch, the locks held on them and their pending changes."""
+
+    def __init__(self):
+        self.locks = ExitStack()
+        self.saved = {}
+        self.deleted = {}
+        self.replaced = set()
+
+    def touch(self, file_path):
+        # First write to a file in this batch: lock it and load it once
+        if file_path not in self.saved:
+            self.locks.enter_context(file_lock(file_path))
+            load_data(file_path)
+            self.saved[file_path] = set()
+            self.deleted[file_path] = set()
+        return _cache[file_path]
+
+    def flush(self):
+        backend = get_backend()
+        # Backends that can, commit all the record writes together (one sqlite transaction, one manifest write)
+        with getattr(backend, 'group', nullcontext)():
+            for file_path, saved in self.saved.items():
+                if not self.dirty(file_path):
+                    continue
+                entry = _cache[file_path]
+                _write_stats['files'] += 1
+                if backend.whole_file or file_path in self.replaced:
+                    backend.save(entry.data, file_path)
+                else:
+                    for key in saved:
+                        backend.save_record(entry.get(key), file_path, loaded=entry.data)
+                    for key in self.deleted[file_path]:
+                        backend.delete_record(key, file_path, loaded=entry.data)
+        if DURABILITY == 'batch':
+            sync()
+        for file_path in self.saved:
+            if not self.dirty(file_path):
+                continue
+            entry = _cache[file_path]
+            stamp_before = entry.stamp
+            entry.stamp = backend.stamp(file_path)
+            _notify(file_path, 'flush', None, stamp_before, entry.stamp)
+
+    def dirty(self, file_path):
+        return bool(self.saved[file_path] or self.deleted[file_path]) or file_path in self.replaced
+
+    def discard(self):
+        for file_path in self.saved:
+            entry = _cache.pop(file_path, None)
+            _notify(file_path, 'discard', None, entry.stamp if entry else None, None)
+
+
+@contextmanager
+def batch():
+    """Hold back every write made in the block and write each touched file once at the end.
+
+    Touched files stay locked and loaded until the block ends, so a batch of
+    thousands of changes costs one load and one save per file. If the block
+    raises, nothing is written and the cached copies are dropped.
+    """
+    global _batch
+    if _batch is not None:
+        yield
+        return
+    _batch = _Batch()
+    try:
+        with _batch.locks:
+            try:
+                yield
+            except BaseException:
+                _batch.discard()
+                raise
+            _batch.flush()
+    finally:
+        _batch = None
+
+
+# Function to load data from file
+def load_data(file_path):
+    backend = get_backend()
+    entry = _cached(file_path, backend)
+    if entry is not None:
+        _cache_stats['hits'] += 1
+        return entry.data
+    _cache_stats['misses'] += 1
+    # Hold the lock so another session cannot be halfway through rewriting the file
+    with file_lock(file_path):
+        stamp = backend.stamp(file_path)
+        data = to_models(backend.load(file_path), file_path)
+    _cache[file_path] = _CacheEntry(stamp, data)
+    return data
+
+
+# Function to save data to file
+def save_data(data, file_path):
+    data = to_models(data, file_path)
+    if _same_records(_cached(file_path, get_backend()), data):
+        _write_stats['skipped'] += len(data)
+        return
+    if _batch is not None:
+        entry = _batch.touch(file_path)
+        _cache[file_path] = entry = _CacheEntry(entry.stamp, data)
+        _batch.replaced.add(file_path)
+        _notify(file_path, 'replace', data, entry.stamp, entry.stamp)
+        return
+    backend = get_backend()
+    with file_lock(file_path):
+        stamp_before = backend.stamp(file_path)
+        backend.save(data, file_path)
+        stamp = backend.stamp(file_path)
+    _write_stats['written'] += len(data)
+    _write_stats['files'] += 1
+    _cache[file_path] = _CacheEntry(stamp, data)
+    _notify(file_path, 'replace', data, stamp_before, stamp)
+
+
+# Function to go through the records of a file one at a time
+def iter_records(file_path):
+    """Yield the records of a file as models without loading the whole file.
+
+    Uses the cached data when it is current and the backend's own reader
+    otherwise; nothing read this way is cached, so stopping early (or
+    keeping only part of each record) bounds memory by one record.
+    """
+    backend = get_backend()
+    entry = _cached(file_path, backend)
+    if entry is not None:
+        yield from entry.data
+    elif hasattr(backend, 'iter_records'):
+        for record in backend.iter_records(file_path):
+            yield to_model(record, file_path)
+    else:
+        yield from load_data(file_path)
+
+
+def _manifest_entry(record):
+    entry = {field: record[field] for field in ShardedBackend.MANIFEST_FIELDS if field in record}
+    if 'tasks' in record:
+        entry['tasks'] = [{'id': task['id']} for task in record['tasks']]
+    return entry
+
+
+# Function to load only the listing fields of each record
+def load_manifest(file_path):
+    backend = get_backend()
+    if _cached(file_path, backend) is None:
+        if hasattr(backend, 'load_manifest'):
+            return backend.load_manifest(file_path)
+        if hasattr(backend, 'iter_records'):
+            # Keep the listing fields and task ids of each record as it streams past
+            return [_manifest_entry(record) for record in backend.iter_records(file_path)]
+    # Full records carry every manifest field too
+    return load_data(file_path)
+
+
+# Function to fetch a single record by id
+def get_record(record_id, file_path, stream=False):
+    """Return the record with id record_id, or None.
+
+    On the whole-file backends a miss loads and caches the file, so the
+    lookups after it are answered from memory. stream=True reads only up to
+    the record and caches nothing instead, for a one-off lookup in a file
+    this process will not read again.
+    """
+    backend = get_backend()
+    entry = _cached(file_path, backend)
+    if entry is not None:
+        _cache_stats['hits'] += 1
+        return entry.get(record_id)
+    if backend.whole_file and not (stream and hasattr(backend, 'iter_records')):
+        load_data(file_path)
+        return _cache[file_path].get(record_id)
+    # Read just this record (stopping at it when the file has to be scanned)
+    _cache_stats['misses'] += 1
+    return to_model(backend.get_record(record_id, file_path), file_path)
+
+
+# Function to insert or replace a single record
+def save_record(record, file_path):
+    """Save a record, bumping its 'version'.
+
+    Raises ConflictError if the stored copy has a different version than the
+    one the record was read at, i.e. another session saved it in between.
+    """
+    if _batch is not None:
+        entry = _batch.touch(file_path)
+        key = record_key(record)
+        stored = entry.get(key)
+        _check_version(stored, record, file_path)
+        if _unchanged(stored, record):
+            _write_stats['skipped'] += 1
+            return
+        _write_stats['written'] += 1
+        record['version'] = record.get('version', 0) + 1
+        record = to_model(record, file_path)
+        entry.put(record)
+        _batch.saved[file_path].add(key)
+        _batch.deleted[file_path].discard(key)
+        _notify(file_path, 'save', record, entry.stamp, entry.stamp)
+        return
+    backend = get_backend()
+    with file_lock(file_path):
+        stamp_before = backend.stamp(file_path)
+        entry = _cached(file_path, backend)
+        key = record_key(record)
+        if entry is not None:
+            stored = entry.get(key)
+        elif backend.whole_file:
+            load_data(file_path)
+            entry = _cache[file_path]
+            stored = entry.get(key)
+        else:
+            stored = backend.get_record(key, file_path)
+        _check_version(stored, record, file_path)
+        if _unchanged(stored, record):
+            _write_stats['skipped'] += 1
+            return
+        record['version'] = record.get('version', 0) + 1
+        record = to_model(record, file_path)
+        backend.save_record(record, file_path, loaded=entry.data if entry else None)
+        stamp = backend.stamp(file_path)
+    _write_stats['written'] += 1
+    _write_stats['files'] += 1
+    if entry is None:
+        _cache.pop(file_path, None)
+    else:
+        entry.put(record)
+        entry.stamp = stamp
+    _notify(file_path, 'save', record, stamp_before, stamp)
+
+
+def _fingerprint(record):
+    return hashlib.blake2b(_dump(record).encode('utf-8'), digest_size=16).digest()
+
+
+def _dump(record):
+    return json.dumps(record, sort_keys=True, default=encode)
+
+
+def _unchanged(stored, record):
+    # A different object with the same content as the stored copy; the stored
+    # object itself may have been changed in place, so it is never skipped here
+    return stored is not None and stored is not record and _fingerprint(stored) == _fingerprint(record)
+
+
+def _same_records(entry, data):
+    # True if data holds exactly the cached records, unchanged and in the same order
+    if entry is None or len(entry.data) != len(data):
+        return False
+    for stored, record in zip(entry.data, data):
+        if stored is record or record_key(stored) != record_key(record) or _fingerprint(stored) != _fingerprint(record):
+            return False
+    return True
+
+
+def _check_version(stored, record, file_path):
+    version = record.get('version', 0)
+    if (stored is None and version > 0) or (stored is not None and stored.get('version', 0) != version):
+        raise ConflictError(f"Record {record_key(record)} in {file_path} was changed by another session.")
+
+
+# Function to remove a single record by id
+def delete_record(record_id, file_path):
+    if _batch is not None:
+        entry = _batch.touch(file_path)
+        if entry.get(record_id) is None:
+            _write_stats['skipped'] += 1
+            return
+        _write_stats['written'] += 1
+        entry.delete(record_id)
+        _batch.deleted[file_path].add(record_id)
+        _batch.saved[file_path].discard(record_id)
+        _notify(file_path, 'delete', record_id, entry.stamp, entry.stamp)
+        return
+    backend = get_backend()
+    with file_lock(file_path):
+        stamp_before = backend.stamp(file_path)
+        entry = _cached(file_path, backend)
+        if entry is not None and entry.get(record_id) is None:
+            _write_stats['skipped'] += 1
+            return
+        backend.delete_record(record_id, file_path, loaded=entry.data if entry else None)
+        stamp = backend.stamp(file_path)
+    _write_stats['written'] += 1
+    _write_stats['files'] += 1
+    if entry is None:
+        _cache.pop(file_path, None)
+    else:
+        entry.delete(record_id)
+        entry.stamp = stamp
+    _notify(file_path, 'delete', record_id, stamp_before, stamp)
+
+
+# Function to change a record safely when other sessions may be writing too
+def update_record(record_id, file_path, change):
+    """Apply change(record) to the current stored copy of a record and save it.
+
+    The read and the save happen under file_lock, and the change is applied
+    again to fresh data if the save still hits a ConflictError. Nothing is
+    written if the change left the record as it was. If the change or the
+    save raises, the cached copy is put back as it was read, so a change
+    that stopped halfway is neither seen by later reads nor saved with the
+    next write. Returns the saved record, or None if the record no longer
+    exists.
+    """
+    for attempt in range(UPDATE_RETRIES):
+        with file_lock(file_path):
+            record = get_record(record_id, file_path)
+            if record is None:
+                return None
+            # Both the test for a change and the copy to go back to
+            snapshot = _dump(record)
+            try:
+                change(record)
+                if _dump(record) == snapshot:
+                    _write_stats['skipped'] += 1
+                    return record
+                save_record(record, file_path)
+                return record
+            except ConflictError:
+                _cache.pop(file_path, None)
+            except BaseException:
+                _restore(record, snapshot, file_path)
+                raise
+    raise ConflictError(f"Could not save record {record_id} in {file_path} after {UPDATE_RETRIES} attempts.")
+
+
+def _restore(record, snapshot, file_path):
+    # Replace a record changed in place in the cache with its state before the change
+    entry = _cache.get(file_path)
+    if entry is not None and entry.get(record_key(record)) is record:
+        entry.put(to_model(json.loads(snapshot), file_path))
+
+
+def benchmark_formats(data, formats=FORMATS, directory=None):
+    """Time saving and loading data in each format and measure the file it makes.
+
+    Returns one dict per format with the save and load time in seconds
+    (serialization plus the file write or read) and the file size in
+    bytes; formats whose package is missing are reported as unavailable.
+    """
+    import tempfile
+    results = []
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        for data_format in formats:
+            if data_format == 'msgpack' and msgpack is None or data_format == 'orjson' and orjson is None:
+                results.append({'format': data_format, 'available': False})
+                continue
+            file_path = os.path.join(tmp_dir, data_format + '.data')
+            started = time.perf_counter()
+            with open(file_path, 'wb') as file:
+                file.write(dump_bytes(data, data_format, indent=4))
+            saved = time.perf_counter()
+            loaded_data = read_data_file(file_path)
+            loaded = time.perf_counter()
+            results.append({
+                'format': data_format,
+                'available': True,
+                'save_seconds': saved - started,
+                'load_seconds': loaded - saved,
+                'bytes': os.path.getsize(file_path),
+                'records': len(loaded_data),
+            })
+    return results
+
+
+def migrate_json_to_sqlite(file_paths, db_path=None):
+    """Copy the given JSON data files into the sqlite database and return the record count of each."""
+    source = JsonBackend()
+    target = SqliteBackend(db_path)
+    counts = {}
+    try:
+        for file_path in file_paths:
+            records = source.load(file_path)
+            target.save(records, file_path)
+            counts[file_path] = len(records)
+    finally:
+        target.close()
+    return counts
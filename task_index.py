@@ -0,0 +1,239 @@
+import atexit
+import bisect
+import json
+import os
+from datetime import datetime
+import storage
+from models import field
+from project_index import get_index
+
+# Path to the projects data file the index is kept for
+PROJECTS_FILE = 'projects.json'
+# Task fields with an index of value -> task ids; 'project' is the id of the task's project
+FIELDS = ('project', 'assigned_to', 'priority', 'status')
+
+
+def _epoch(end_time):
+    # Tasks without a readable end time are left out of the deadline index
+    if isinstance(end_time, str):
+        try:
+            end_time = datetime.fromisoformat(end_time)
+        except ValueError:
+            return None
+    return end_time.timestamp() if end_time else None
+
+
+class TaskIndex:
+    """Indexes over the tasks of every project, for queries on several fields at once.
+
+    'tasks' holds the queried fields of each task, 'values' maps each of
+    FIELDS to {value: set of task ids}, and 'deadlines' is the sorted list
+    of (end time as epoch, task id). A query asks each index how many
+    tasks it would give, walks the smallest of them and checks the other
+    criteria on each task, so the cost follows the most selective
+    criterion rather than the number of tasks. The tables follow the
+    storage observers and are saved to '<file>.tasks' like the project
+    index.
+    """
+
+    def __init__(self, file_path=PROJECTS_FILE):
+        self.file_path = file_path
+        # Resolved now, so the index stays next to its data file if the working directory changes
+        self.index_path = os.path.abspath(file_path) + '.tasks'
+        self.stamp = None
+        self.dirty = False
+        self._clear()
+        storage.add_observer(file_path, self.on_change)
+        atexit.register(self.persist)
+
+    def _clear(self):
+        # task id -> [project id, assigned_to, priority, status, end epoch, description]
+        self.tasks = {}
+        self.project_tasks = {}
+        self.values = {name: {} for name in FIELDS}
+        self.deadlines = []
+
+    def plan(self, criteria):
+        """Return (name of the index to walk, its task ids) for a query.
+
+        criteria maps the FIELDS to a set of accepted values, and may have
+        'due' as an (earliest, latest) pair of epochs, either one None.
+        """
+        self.refresh()
+        best = None
+        for name in FIELDS:
+            if criteria.get(name) is None:
+                continue
+            size = sum(len(self.values[name].get(value, ())) for value in criteria[name])
+            if best is None or size < best[1]:
+                best = (name, size)
+        if criteria.get('due'):
+            low, high = self._deadline_range(*criteria['due'])
+            if best is None or high - low < best[1]:
+                return 'end_time', (task_id for _, task_id in self.deadlines[low:high])
+        if best is None:
+            return 'all', iter(list(self.tasks))
+        name = best[0]
+        return name, (task_id for value in criteria[name] for task_id in self.values[name].get(value, ()))
+
+    def query(self, criteria):
+        """Return the ids of the tasks that meet every criterion, earliest end time first."""
+        _, candidates = self.plan(criteria)
+        positions = [(position, criteria[name]) for position, name in enumerate(FIELDS) if criteria.get(name) is not None]
+        low, high = criteria.get('due') or (None, None)
+        found = []
+        for task_id in candidates:
+            task = self.tasks[task_id]
+            if any(task[position] not in accepted for position, accepted in positions):
+                continue
+            if low is not None or high is not None:
+                if task[4] is None or (low is not None and task[4] < low) or (high is not None and task[4] > high):
+                    continue
+            found.append(task_id)
+        # Tasks without an end time go last
+        found.sort(key=lambda task_id: (self.tasks[task_id][4] is None, self.tasks[task_id][4] or 0))
+        return found
+
+    def _deadline_range(self, low, high):
+        # (low,) sorts before every entry ending at low, and (high, chr(0x10FFFF)) after them
+        start = 0 if low is None else bisect.bisect_left(self.deadlines, (low,))
+        end = len(self.deadlines) if high is None else bisect.bisect_right(self.deadlines, (high, chr(0x10FFFF)))
+        return start, end
+
+    def refresh(self):
+        """Make sure the tables describe the current data file."""
+        stamp = storage.get_backend().stamp(self.file_path)
+        if stamp == self.stamp:
+            return
+        if self._load_persisted(stamp):
+            return
+        self.rebuild(storage.iter_records(self.file_path))
+        self.stamp = stamp
+
+    def rebuild(self, projects):
+        self._clear()
+        for project in projects:
+            self._add_project(project, keep_sorted=False)
+        # One sort for the whole list instead of an insort per task
+        self.deadlines.sort()
+        self.dirty = True
+
+    def on_change(self, change, payload, stamp_before, stamp_after):
+        if self.stamp != stamp_before or change == 'discard':
+            # Tables are out of date; rebuild on next query
+            self.stamp = None
+            return
+        if change == 'replace':
+            self.rebuild(payload)
+        elif change == 'save':
+            self._remove_project(payload['id'])
+            self._add_project(payload)
+        elif change == 'delete':
+            self._remove_project(payload)
+        self.stamp = stamp_after
+        self.dirty = True
+
+    def _add_project(self, project, keep_sorted=True):
+        task_ids = []
+        for task in project.get('tasks', []):
+            self._add_task(task['id'], [project['id'], task.get('assigned_to'), task.get('priority'), task.get('status'),
+                                        _epoch(field(task, 'end_time')), task.get('description')], keep_sorted)
+            task_ids.append(task['id'])
+        self.project_tasks[project['id']] = task_ids
+
+    def _add_task(self, task_id, task, keep_sorted=True):
+        self.tasks[task_id] = task
+        for position, name in enumerate(FIELDS):
+            self.values[name].setdefault(task[position], set()).add(task_id)
+        if task[4] is None:
+            return
+        if keep_sorted:
+            bisect.insort(self.deadlines, (task[4], task_id))
+        else:
+            self.deadlines.append((task[4], task_id))
+
+    def _remove_project(self, project_id):
+        for task_id in self.project_tasks.pop(project_id, ()):
+            task = self.tasks.pop(task_id, None)
+            if task is None:
+                continue
+            for position, name in enumerate(FIELDS):
+                task_ids = self.values[name].get(task[position])
+                if task_ids is not None:
+                    task_ids.discard(task_id)
+                    if not task_ids:
+                        del self.values[name][task[position]]
+            if task[4] is not None:
+                position = bisect.bisect_left(self.deadlines, (task[4], task_id))
+                if position < len(self.deadlines) and self.deadlines[position] == (task[4], task_id):
+                    del self.deadlines[position]
+
+    def persist(self):
+        if not self.dirty or self.stamp is None:
+            return
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump({'stamp': self.stamp, 'tasks': self.tasks, 'project_tasks': self.project_tasks}, file)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # The index is only a shortcut; it gets rebuilt from the data when missing
+            return
+        self.dirty = False
+
+    def _load_persisted(self, stamp):
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, 'r') as file:
+                state = json.load(file)
+        except json.JSONDecodeError:
+            return False
+        # JSON turns the stamp tuples into lists; compare through a round trip
+        if state.get('stamp') != json.loads(json.dumps(stamp)):
+            return False
+        self._clear()
+        # The value and deadline indexes are rebuilt from the saved task fields
+        for task_id, task in state['tasks'].items():
+            self.tasks[task_id] = task
+            for position, name in enumerate(FIELDS):
+                self.values[name].setdefault(task[position], set()).add(task_id)
+        self.deadlines = sorted((task[4], task_id) for task_id, task in self.tasks.items() if task[4] is not None)
+        self.project_tasks = state['project_tasks']
+        self.stamp = stamp
+        self.dirty = False
+        return True
+
+
+_indexes = {}
+
+
+def get_task_index(file_path=PROJECTS_FILE):
+    """Return the shared task index for a projects file."""
+    if file_path not in _indexes:
+        _indexes[file_path] = TaskIndex(file_path)
+    return _indexes[file_path]
+
+
+# Function to find the tasks a user can see that meet every criterion
+def query_tasks(username, criteria, file_path=PROJECTS_FILE):
+    """Return the matching tasks of the projects username leads or is a member of, earliest end time first."""
+    projects = get_index(file_path)
+    visible = set(projects.project_ids_led_by(username)) | set(projects.project_ids_joined_by(username))
+    criteria = dict(criteria)
+    # Projects the user cannot see are left out like any other criterion
+    criteria['project'] = visible if criteria.get('project') is None else set(criteria['project']) & visible
+    index = get_task_index(file_path)
+    hits = []
+    for task_id in index.query(criteria):
+        project_id, assigned_to, priority, status, end, description = index.tasks[task_id]
+        hits.append({
+            'project': projects.summary(project_id)['title'],
+            'task': task_id,
+            'description': description,
+            'assigned_to': assigned_to,
+            'priority': priority,
+            'status': status,
+            'end_time': datetime.fromtimestamp(end).isoformat() if end is not None else None,
+        })
+    return hits
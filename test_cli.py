@@ -0,0 +1,77 @@
+import unittest
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+import storage
+import operations
+import cli
+from storage import JsonBackend
+from test_storage import log_to, restore_log, forget_indexes
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        storage.set_backend(JsonBackend())
+        storage.save_data([{'id': 'u1', 'username': 'ali', 'active': True},
+                           {'id': 'u2', 'username': 'sara', 'active': True}], 'users.json')
+        storage.save_data([{'id': 'p1', 'title': 'Board', 'leader': 'ali', 'members': ['ali'], 'tasks': []}], 'projects.json')
+        self.record_events = operations.record_events
+        operations.record_events = lambda events: None
+        self.log_sink = log_to(self.tmp_dir.name)
+
+    def tearDown(self):
+        operations.record_events = self.record_events
+        forget_indexes()
+        restore_log(self.log_sink)
+        storage.set_backend(None)
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def run_batch(self, *lines):
+        with open('batch.jsonl', 'w') as file:
+            for line in lines:
+                file.write((line if isinstance(line, str) else json.dumps(line)) + '\n')
+        output = io.StringIO()
+        with redirect_stdout(output):
+            succeeded = cli.run_batch('batch.jsonl')
+        return succeeded, output.getvalue().splitlines()
+
+    def members(self):
+        with open('projects.json') as file:
+            return json.load(file)[0]['members']
+
+    def test_good_batch_is_applied(self):
+        succeeded, output = self.run_batch({'command': 'add-member', 'user': 'ali', 'project': 'Board', 'member': 'sara'})
+        self.assertTrue(succeeded)
+        self.assertEqual(output[0], '1 commands applied, 0 failed.')
+        self.assertEqual(self.members(), ['ali', 'sara'])
+
+    def test_bad_lines_are_reported_and_the_rest_applied(self):
+        succeeded, output = self.run_batch('{"command": "add-member"',
+                                           '["add-member", "ali"]',
+                                           {'command': 'no-such-command', 'user': 'ali'},
+                                           {'command': 'add-member', 'user': 'ali', 'project': 'Board', 'member': 'sara'})
+        self.assertFalse(succeeded)
+        self.assertEqual([line.split(':')[0] for line in output[:3]], ['Line 1', 'Line 2', 'Line 3'])
+        self.assertEqual(output[3], '1 commands applied, 3 failed.')
+        self.assertEqual(self.members(), ['ali', 'sara'])
+
+    def test_bad_argument_types_are_line_errors(self):
+        succeeded, output = self.run_batch({'command': 'add-member', 'user': 'ali', 'project': ['Board'], 'member': 'sara'},
+                                           {'command': 'add-member', 'user': {'name': 'ali'}, 'project': 'Board', 'member': 'sara'},
+                                           {'command': ['add-member'], 'user': 'ali'},
+                                           {'command': 'list-comments', 'user': 'ali', 'project': 'Board', 'task': 't1', 'page': True})
+        self.assertFalse(succeeded)
+        self.assertEqual(output[:2], ['Line 1: The project argument must be a string.', 'Line 2: The user argument must be a string.'])
+        self.assertTrue(output[2].startswith('Line 3: Unknown command'))
+        self.assertEqual(output[3], 'Line 4: The page argument must be a string.')
+        self.assertEqual(output[4], '0 commands applied, 4 failed.')
+        self.assertEqual(self.members(), ['ali'])
+
+if __name__ == '__main__':
+    unittest.main()
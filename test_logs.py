@@ -0,0 +1,117 @@
+import unittest
+import json
+import os
+import re
+import tempfile
+from datetime import datetime
+from unittest import mock
+import activity
+from log_export import export_new_logs
+from log_reader import iter_log_lines, save_logs_to_json
+
+class TestLogExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp_dir.name, 'app.log')
+        self.export_file = os.path.join(self.tmp_dir.name, 'logs.jsonl')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_log(self, text, mode='a'):
+        with open(self.log_file, mode) as file:
+            file.write(text)
+
+    def exported(self):
+        with open(self.export_file, 'r') as file:
+            return [json.loads(line)['log'] for line in file]
+
+    def test_only_new_complete_lines_are_exported(self):
+        self.write_log('first\nsecond\nthi')
+        self.assertEqual(export_new_logs(self.log_file, self.export_file), 2)
+        self.assertEqual(export_new_logs(self.log_file, self.export_file), 0)
+        self.write_log('rd\n')
+        self.assertEqual(export_new_logs(self.log_file, self.export_file), 1)
+        self.assertEqual(self.exported(), ['first', 'second', 'third'])
+
+    def rotate(self, time):
+        # Same naming as loguru's rotation
+        rotated = os.path.join(self.tmp_dir.name, f'app.{time}.log')
+        os.rename(self.log_file, rotated)
+        os.utime(rotated, ns=(0, int(time[-6:]) * 1000))
+        return rotated
+
+    def test_rest_of_rotated_log_is_exported_before_the_new_one(self):
+        self.write_log('old line one\n')
+        export_new_logs(self.log_file, self.export_file)
+        self.write_log('old line two\n')
+        self.rotate('2026-10-18_10-00-00_000001')
+        self.write_log('new\n', 'w')
+        self.assertEqual(export_new_logs(self.log_file, self.export_file), 2)
+        self.assertEqual(self.exported(), ['old line one', 'old line two', 'new'])
+
+    def test_reader_streams_rotated_files_in_order(self):
+        self.write_log('first\n')
+        self.rotate('2026-10-18_10-00-00_000001')
+        self.write_log('second\n')
+        self.rotate('2026-10-18_11-00-00_000002')
+        self.write_log('third\n')
+        lines = iter_log_lines(self.log_file)
+        self.assertEqual(next(lines), 'first')
+        self.assertEqual(list(lines), ['second', 'third'])
+        json_file = os.path.join(self.tmp_dir.name, 'logs.json')
+        save_logs_to_json(json_file, self.log_file)
+        self.write_log('fourth\n')
+        save_logs_to_json(json_file, self.log_file)
+        with open(json_file, 'r') as file:
+            self.assertEqual([entry['log'] for entry in json.load(file)], ['first', 'second', 'third', 'fourth'])
+
+class TestActivityLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.activity_dir = os.path.join(self.tmp_dir.name, 'activity')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def record_at(self, time, action, actor, project_id=None):
+        with mock.patch('activity.datetime') as clock:
+            clock.now.return_value = datetime.fromisoformat(time)
+            activity.record_event(action, actor, project_id, activity_dir=self.activity_dir)
+
+    def query(self, **filters):
+        return [(event['time'], event['action']) for event in activity.query_events(activity_dir=self.activity_dir, **filters)]
+
+    def test_events_are_filtered_by_every_field(self):
+        self.record_at('2026-09-30T10:00:00', 'create_project', 'ali', 'p1')
+        self.record_at('2026-10-01T09:00:00', 'add_member', 'ali', 'p1')
+        self.record_at('2026-10-02T09:00:00', 'assign_task', 'ali', 'p2')
+        self.record_at('2026-10-03T09:00:00', 'add_comment', 'sara', 'p1')
+        self.assertEqual(len(os.listdir(self.activity_dir)), 5)  # two months, their indexes and the lock
+        self.assertEqual(self.query(actor='ali', project_id='p1'), [
+            ('2026-09-30T10:00:00', 'create_project'), ('2026-10-01T09:00:00', 'add_member')
+        ])
+        self.assertEqual(self.query(since='2026-10-01', until='2026-10-02'), [
+            ('2026-10-01T09:00:00', 'add_member'), ('2026-10-02T09:00:00', 'assign_task')
+        ])
+        self.assertEqual(self.query(action='add_comment'), [('2026-10-03T09:00:00', 'add_comment')])
+
+    def test_range_query_seeks_through_the_index(self):
+        with mock.patch('activity.INDEX_STRIDE', 1):
+            for day in range(1, 29):
+                self.record_at(f'2026-10-{day:02d}T12:00:00', 'login', 'ali')
+        file_path = activity.month_path('2026-10', self.activity_dir)
+        times, offsets = activity.read_index(file_path)
+        self.assertEqual(len(times), 28)
+        # Rewrite the events before the 19th so a full scan would report them as in range
+        with open(file_path, 'r+') as file:
+            head = file.read(offsets[18])
+            file.seek(0)
+            file.write(re.sub(r'2026-10-\d\dT12:00:00", "action": "login', '2026-10-20T12:00:00", "action": "stale', head))
+        events = self.query(since='2026-10-20', until='2026-10-21')
+        self.assertEqual(events, [('2026-10-20T12:00:00', 'login'), ('2026-10-21T12:00:00', 'login')])
+
+if __name__ == '__main__':
+    unittest.main()
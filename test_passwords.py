@@ -0,0 +1,38 @@
+import unittest
+import base64
+import passwords
+from passwords import hash_password, verify_password, needs_rehash
+
+# Cheap work factors keep the tests fast
+FAST_SCRYPT = {'method': 'scrypt', 'n': 2 ** 4, 'r': 8, 'p': 1}
+FAST_PBKDF2 = {'method': 'pbkdf2', 'hash_name': 'sha256', 'iterations': 10}
+
+class TestPasswords(unittest.TestCase):
+
+    def test_hash_records_verify_with_their_own_params(self):
+        for params in (FAST_SCRYPT, FAST_PBKDF2):
+            stored = hash_password('secret', params)
+            self.assertEqual(stored['method'], params['method'])
+            self.assertTrue(verify_password('secret', stored))
+            self.assertFalse(verify_password('Secret', stored))
+        self.assertNotEqual(hash_password('secret', FAST_SCRYPT)['salt'], hash_password('secret', FAST_SCRYPT)['salt'])
+
+    def test_old_base64_and_plaintext_records_verify_and_need_rehash(self):
+        encoded = base64.b64encode(b'secret').decode('utf-8')
+        self.assertTrue(verify_password('secret', encoded))
+        self.assertTrue(verify_password('secret', 'secret'))
+        self.assertFalse(verify_password('other', encoded))
+        self.assertTrue(needs_rehash(encoded))
+
+    def test_changed_work_factors_need_rehash(self):
+        stored = hash_password('secret', passwords.current_params())
+        self.assertFalse(needs_rehash(stored))
+        self.assertTrue(needs_rehash(hash_password('secret', FAST_SCRYPT)))
+
+    def test_benchmark_reports_each_setting(self):
+        results = passwords.benchmark([FAST_SCRYPT, FAST_PBKDF2], threads=2, seconds=0.05)
+        self.assertEqual([result['params'] for result in results], [FAST_SCRYPT, FAST_PBKDF2])
+        self.assertTrue(all(result['logins_per_second'] > 0 for result in results))
+
+if __name__ == '__main__':
+    unittest.main()
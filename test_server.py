@@ -0,0 +1,137 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import storage
+import operations
+import expiry
+from server import ApiServer
+from passwords import hash_password
+from storage import JsonBackend
+from test_storage import log_to, restore_log, forget_indexes
+
+# Cheap work factors keep the logins fast
+FAST_SCRYPT = {'method': 'scrypt', 'n': 2 ** 4, 'r': 8, 'p': 1}
+
+class TestApiServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        storage.set_backend(JsonBackend())
+        storage.save_data([{'id': 'u1', 'username': 'ali', 'active': True, 'password': hash_password('ali-secret', FAST_SCRYPT)},
+                           {'id': 'u2', 'username': 'sara', 'active': True, 'password': hash_password('sara-secret', FAST_SCRYPT)}], 'users.json')
+        storage.save_data([{'id': 'p1', 'title': 'Board', 'leader': 'ali', 'members': ['ali', 'sara'], 'tasks': []}], 'projects.json')
+        self.record_events = operations.record_events
+        operations.record_events = lambda events: None
+        self.log_sink = log_to(self.tmp_dir.name)
+        self.server = ApiServer(flush_interval=0)
+
+    def tearDown(self):
+        operations.record_events = self.record_events
+        scheduler = expiry._schedulers.pop(expiry.PROJECTS_FILE, None)
+        if scheduler is not None:
+            storage._observers[scheduler.file_path].remove(scheduler.on_change)
+        forget_indexes()
+        restore_log(self.log_sink)
+        storage.set_backend(None)
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def login(self, username):
+        status, response = self.server.handle('POST', '/login', {'user': username, 'password': f'{username}-secret'})
+        self.assertEqual(status, 200)
+        return response['result']['token']
+
+    def test_normal_call_runs_as_the_logged_in_user(self):
+        token = self.login('ali')
+        status, response = self.server.handle('POST', '/projects/Board/members', {'member': 'reza'}, token)
+        self.assertEqual(status, 200)
+        self.assertEqual(storage.get_record('p1', 'projects.json')['members'], ['ali', 'sara', 'reza'])
+        status, response = self.server.handle('GET', '/projects', None, token)
+        self.assertEqual((status, [project['title'] for project in response['result']['led']]), (200, ['Board']))
+
+    def test_requests_need_a_valid_token(self):
+        self.assertEqual(self.server.handle('POST', '/login', {'user': 'ali', 'password': 'wrong'})[0], 401)
+        self.assertEqual(self.server.handle('GET', '/projects', None)[0], 401)
+        self.assertEqual(self.server.handle('GET', '/projects', None, 'made-up')[0], 401)
+        token = self.login('ali')
+        self.assertEqual(self.server.handle('POST', '/logout', {}, token)[0], 200)
+        self.assertEqual(self.server.handle('GET', '/projects', None, token)[0], 401)
+
+    def test_deactivated_users_lose_their_sessions(self):
+        token = self.login('sara')
+        self.assertEqual(self.server.handle('GET', '/projects', None, token)[0], 200)
+        # Another session deactivates sara by rewriting users.json behind this process's cache
+        with open('users.json') as file:
+            users = json.load(file)
+        users[1]['active'] = False
+        with open('users.json', 'w') as file:
+            json.dump(users, file)
+        storage.clear_cache()
+        status, response = self.server.handle('POST', '/projects', {'project': 'Sara board'}, token)
+        self.assertEqual(status, 401)
+        self.assertEqual(self.server.sessions, {})
+        self.assertIsNone(operations.find_project_by_title('Sara board'))
+
+    def test_password_checks_do_not_hold_up_other_requests(self):
+        token = self.login('ali')
+        self.server.worker = ThreadPoolExecutor(max_workers=1)
+        self.server.hasher = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.server.worker.shutdown)
+        self.addCleanup(self.server.hasher.shutdown)
+        finished = []
+
+        def slow_verify(password, stored):
+            time.sleep(0.3)
+            return True
+
+        async def log_in():
+            result = await self.server.serve_login({'user': 'sara', 'password': 'sara-secret'})
+            finished.append('login')
+            return result
+
+        async def list_projects():
+            result = await self.server.call(self.server.handle, 'GET', '/projects', None, token)
+            finished.append('request')
+            return result
+
+        async def both():
+            return await asyncio.gather(log_in(), list_projects())
+
+        with mock.patch('server.verify_password', slow_verify):
+            (status, response), (request_status, _) = asyncio.run(both())
+        self.assertEqual((status, request_status), (200, 200))
+        self.assertEqual(finished, ['request', 'login'])
+        self.assertEqual(self.server.session_user(response['result']['token']), 'sara')
+
+    def test_unknown_routes(self):
+        token = self.login('ali')
+        self.assertEqual(self.server.handle('GET', '/nothing/here', None, token)[0], 404)
+        self.assertEqual(self.server.handle('PUT', '/projects', {}, token)[0], 405)
+        self.assertEqual(self.server.handle('GET', '/login', None)[0], 405)
+
+    def test_bad_bodies_are_refused(self):
+        token = self.login('ali')
+        status, response = self.server.handle('POST', '/projects', ['Another'], token)
+        self.assertEqual((status, response), (400, {'error': 'Request body must be a JSON object'}))
+        status, response = self.server.handle('POST', '/projects/Board/members', {'member': ['reza']}, token)
+        self.assertEqual((status, response), (400, {'error': 'The member argument must be a string.'}))
+        self.assertEqual(self.server.handle('POST', '/login', {'user': ['ali'], 'password': 'ali-secret'})[0], 400)
+        self.assertEqual(storage.get_record('p1', 'projects.json')['members'], ['ali', 'sara'])
+
+    def test_user_in_the_request_cannot_act_as_another_user(self):
+        token = self.login('sara')
+        status, response = self.server.handle('DELETE', '/projects/Board?user=ali', {'user': 'ali'}, token)
+        self.assertEqual(status, 400)
+        self.assertIsNotNone(storage.get_record('p1', 'projects.json'))
+        status, response = self.server.handle('POST', '/projects', {'user': 'ali', 'project': 'Sara board'}, token)
+        self.assertEqual((status, response['result']['leader']), (200, 'sara'))
+
+if __name__ == '__main__':
+    unittest.main()
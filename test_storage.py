@@ -0,0 +1,909 @@
+import unittest
+import gzip
+import json
+import multiprocessing
+import os
+import tempfile
+import uuid
+from unittest import mock
+from datetime import datetime
+from loguru import logger
+import storage
+import session
+import project_index
+import user_index
+import search_index
+import task_index
+from project_index import ProjectIndex
+from user_index import UserIndex
+from expiry import ExpiryScheduler
+from search_index import SearchIndex
+from task_index import TaskIndex
+import archive
+import comments
+import api_client
+from models import Project, Status
+from storage import JsonBackend, JournalBackend, ShardedBackend, SqliteBackend
+
+
+def log_to(directory):
+    """Send the operation log to directory instead of the real app.log; returns the sink for restore_log."""
+    logger.remove()
+    return logger.add(os.path.join(directory, 'app.log'), level="INFO")
+
+
+def restore_log(sink):
+    import operations
+    logger.remove(sink)
+    logger.add(operations.log_file_path, rotation="1 MB", retention="10 days", level="INFO")
+
+
+def forget_indexes():
+    """Save the shared indexes where they are and stop them following the data files."""
+    for module in (project_index, user_index, search_index, task_index):
+        for index in module._indexes.values():
+            index.persist()
+            callbacks = storage._observers.get(index.file_path, [])
+            if index.on_change in callbacks:
+                callbacks.remove(index.on_change)
+        module._indexes.clear()
+
+
+class TestStorageBackends(unittest.TestCase):
+
+    def setUp(self):
+        # Work inside a temporary directory so no real data files are touched
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        self.users_file = os.path.join(self.tmp_dir.name, 'users.json')
+        self.db_file = os.path.join(self.tmp_dir.name, 'test.db')
+        self.projects = [self.make_project(f'Project {i}') for i in range(3)]
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def make_project(self, title):
+        return {
+            'id': str(uuid.uuid4()),
+            'title': title,
+            'leader': 'testuser',
+            'members': ['testuser'],
+            'tasks': []
+        }
+
+    def check_backend(self, backend):
+        backend.save(self.projects, self.projects_file)
+        self.assertEqual(backend.load(self.projects_file), self.projects)
+
+        project = dict(self.projects[1], members=['testuser', 'newmember'])
+        backend.save_record(project, self.projects_file)
+        self.assertEqual(backend.get_record(project['id'], self.projects_file)['members'], ['testuser', 'newmember'])
+
+        backend.delete_record(self.projects[0]['id'], self.projects_file)
+        titles = [p['title'] for p in backend.load(self.projects_file)]
+        self.assertEqual(titles, ['Project 1', 'Project 2'])
+
+    def test_json_backend(self):
+        self.check_backend(JsonBackend())
+
+    def test_journal_backend(self):
+        self.check_backend(JournalBackend())
+
+    def test_journal_appends_instead_of_rewriting_snapshot(self):
+        backend = JournalBackend(compact_threshold=1000)
+        backend.save(self.projects, self.projects_file)
+        snapshot_mtime = os.stat(self.projects_file).st_mtime_ns
+        self.projects[0]['members'].append('newmember')
+        backend.save_record(self.projects[0], self.projects_file)
+        self.assertEqual(os.stat(self.projects_file).st_mtime_ns, snapshot_mtime)
+        self.assertEqual(JournalBackend().load(self.projects_file), self.projects)
+
+    def test_journal_compaction_and_torn_entry(self):
+        backend = JournalBackend(compact_threshold=2)
+        backend.save(self.projects, self.projects_file)
+        for project in self.projects:
+            project['title'] += ' (edited)'
+            backend.save_record(project, self.projects_file)
+        backend.wait_for_compaction()
+        with open(backend.journal_path(self.projects_file), 'a') as journal:
+            journal.write('{"op": "put", "rec')
+        self.assertEqual(JournalBackend().load(self.projects_file), self.projects)
+        self.assertEqual(JsonBackend().load(self.projects_file)[0]['title'], 'Project 0 (edited)')
+
+    def test_sharded_backend(self):
+        self.check_backend(ShardedBackend())
+
+    def test_sharded_save_record_rewrites_only_its_shard(self):
+        backend = ShardedBackend()
+        backend.save(self.projects, self.projects_file)
+        manifest_path = backend.manifest_path(self.projects_file)
+        other_shard = backend.shard_path(self.projects[1]['id'], self.projects_file)
+        os.utime(manifest_path, ns=(0, 0))
+        os.utime(other_shard, ns=(0, 0))
+        self.projects[0]['tasks'].append({'id': 't1', 'description': 'New task'})
+        backend.save_record(self.projects[0], self.projects_file)
+        self.assertEqual(os.stat(manifest_path).st_mtime_ns, 0)
+        self.assertEqual(os.stat(other_shard).st_mtime_ns, 0)
+        self.assertEqual(backend.get_record(self.projects[0]['id'], self.projects_file)['tasks'][0]['id'], 't1')
+        self.assertEqual(backend.load_manifest(self.projects_file)[0], {
+            'id': self.projects[0]['id'], 'title': 'Project 0', 'leader': 'testuser', 'members': ['testuser']
+        })
+
+    def test_sharded_stamp_changes_within_one_clock_tick(self):
+        backend = ShardedBackend()
+        backend.save(self.projects, self.projects_file)
+        stamp_path = os.path.join(backend.shard_dir(self.projects_file), '.stamp')
+        stamps = set()
+        for number in range(3):
+            self.projects[0]['title'] = f'Edit {number}'
+            backend.save_record(self.projects[0], self.projects_file)
+            # Same mtime every time, as for writes made within one tick
+            os.utime(stamp_path, ns=(0, 0))
+            stamps.add(backend.stamp(self.projects_file))
+        self.assertEqual(len(stamps), 3)
+
+    def test_sqlite_backend(self):
+        backend = SqliteBackend(self.db_file)
+        self.check_backend(backend)
+        backend.close()
+
+    def test_sqlite_save_writes_only_changed_rows(self):
+        backend = SqliteBackend(self.db_file)
+        backend.save(self.projects, self.projects_file)
+        connection = backend._connect()
+        before = connection.total_changes
+        self.projects[2]['title'] = 'Renamed'
+        backend.save(self.projects, self.projects_file)
+        self.assertEqual(connection.total_changes - before, 1)
+        backend.close()
+
+    def test_migrate_json_to_sqlite(self):
+        JsonBackend().save(self.projects, self.projects_file)
+        JsonBackend().save([{'id': '1', 'username': 'testuser'}], self.users_file)
+        counts = storage.migrate_json_to_sqlite([self.projects_file, self.users_file], self.db_file)
+        self.assertEqual(counts[self.projects_file], 3)
+        backend = SqliteBackend(self.db_file)
+        self.assertEqual(backend.load(self.projects_file), self.projects)
+        self.assertEqual(backend.get_record('1', self.users_file)['username'], 'testuser')
+        backend.close()
+
+class TestRepositoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        storage.set_backend(JsonBackend())
+        JsonBackend().save([{'id': '1', 'title': 'First', 'members': []}], self.projects_file)
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_repeated_loads_hit_the_cache(self):
+        first = storage.load_data(self.projects_file)
+        second = storage.load_data(self.projects_file)
+        self.assertIs(first, second)
+        self.assertEqual(storage.cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_writes_keep_the_cache_current(self):
+        projects = storage.load_data(self.projects_file)
+        storage.save_record({'id': '2', 'title': 'Second', 'members': []}, self.projects_file)
+        self.assertEqual([p['title'] for p in storage.load_data(self.projects_file)], ['First', 'Second'])
+        storage.delete_record('1', self.projects_file)
+        self.assertIs(storage.load_data(self.projects_file), projects)
+        self.assertEqual(storage.cache_stats()['misses'], 1)
+        self.assertEqual(JsonBackend().load(self.projects_file), projects)
+
+    def test_external_change_invalidates_the_cache(self):
+        storage.load_data(self.projects_file)
+        JsonBackend().save([{'id': '3', 'title': 'Written by another session'}], self.projects_file)
+        os.utime(self.projects_file, ns=(0, 0))
+        self.assertEqual(storage.load_data(self.projects_file)[0]['id'], '3')
+        self.assertEqual(storage.cache_stats()['misses'], 2)
+
+    def test_batch_writes_once_on_exit(self):
+        with storage.batch():
+            storage.save_record({'id': '2', 'title': 'Second', 'members': []}, self.projects_file)
+            storage.update_record('1', self.projects_file, lambda project: project['members'].append('a'))
+            storage.delete_record('2', self.projects_file)
+            storage.save_record({'id': '3', 'title': 'Third', 'members': []}, self.projects_file)
+            self.assertEqual(JsonBackend().load(self.projects_file), [{'id': '1', 'title': 'First', 'members': []}])
+            self.assertEqual([p['id'] for p in storage.load_data(self.projects_file)], ['1', '3'])
+        saved = JsonBackend().load(self.projects_file)
+        self.assertEqual([p['id'] for p in saved], ['1', '3'])
+        self.assertEqual(saved[0]['members'], ['a'])
+
+    def test_failed_batch_discards_changes(self):
+        with self.assertRaises(RuntimeError):
+            with storage.batch():
+                storage.save_record({'id': '2', 'title': 'Second', 'members': []}, self.projects_file)
+                raise RuntimeError('stop')
+        self.assertEqual([p['id'] for p in storage.load_data(self.projects_file)], ['1'])
+
+def add_members(projects_file, prefix, count):
+    # Runs in a separate process, like a second CLI session on the same data
+    storage.set_backend(JsonBackend())
+    for i in range(count):
+        storage.update_record('1', projects_file, lambda project: project['members'].append(f'{prefix}{i}'))
+
+class TestConcurrentSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        storage.set_backend(JsonBackend())
+        storage.save_data([{'id': '1', 'title': 'Shared', 'members': []}], self.projects_file)
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_stale_save_raises_conflict(self):
+        project = storage.get_record('1', self.projects_file)
+        other_session = JsonBackend()
+        fresh = other_session.load(self.projects_file)[0]
+        fresh['version'] = project.get('version', 0) + 1
+        other_session.save([fresh], self.projects_file)
+        os.utime(self.projects_file, ns=(0, 0))
+        project['members'].append('lost')
+        with self.assertRaises(storage.ConflictError):
+            storage.save_record(project, self.projects_file)
+
+    def test_update_record_applies_change_to_fresh_data(self):
+        storage.update_record('1', self.projects_file, lambda project: project['members'].append('a'))
+        JsonBackend().save([{'id': '1', 'title': 'Shared', 'members': ['a', 'b'], 'version': 2}], self.projects_file)
+        os.utime(self.projects_file, ns=(0, 0))
+        project = storage.update_record('1', self.projects_file, lambda project: project['members'].append('c'))
+        self.assertEqual(project['members'], ['a', 'b', 'c'])
+        self.assertEqual(project['version'], 3)
+
+    def test_failed_change_is_not_kept_or_saved_later(self):
+        def add_and_fail(project):
+            project['members'].append('mallory')
+            raise ValueError("Refused halfway")
+        with self.assertRaises(ValueError):
+            storage.update_record('1', self.projects_file, add_and_fail)
+        self.assertEqual(storage.get_record('1', self.projects_file)['members'], [])
+        storage.update_record('1', self.projects_file, lambda project: project.update(title='Renamed'))
+        stored = JsonBackend().load(self.projects_file)[0]
+        self.assertEqual((stored['title'], stored['members']), ('Renamed', []))
+
+    def test_parallel_sessions_do_not_lose_updates(self):
+        sessions = [multiprocessing.Process(target=add_members, args=(self.projects_file, prefix, 20)) for prefix in 'xy']
+        for session in sessions:
+            session.start()
+        for session in sessions:
+            session.join()
+        project = JsonBackend().load(self.projects_file)[0]
+        self.assertEqual(len(project['members']), 40)
+        self.assertEqual(project['version'], 40)
+
+class TestProjectIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        storage.set_backend(JsonBackend())
+        self.project = {
+            'id': 'p1',
+            'title': 'Alpha',
+            'leader': 'lead',
+            'members': ['lead', 'dev'],
+            'tasks': [{'id': 't1', 'description': 'Write docs'}]
+        }
+        storage.save_data([self.project], self.projects_file)
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_lookups_follow_mutations(self):
+        index = ProjectIndex(self.projects_file)
+        self.assertEqual(index.project_id_by_title('Alpha'), 'p1')
+        self.assertEqual(index.project_id_by_task('t1'), 'p1')
+        self.project['title'] = 'Beta'
+        self.project['members'].remove('dev')
+        storage.save_record(self.project, self.projects_file)
+        self.assertIsNone(index.project_id_by_title('Alpha'))
+        self.assertEqual(index.project_id_by_title('Beta'), 'p1')
+        self.assertEqual(index.project_ids_joined_by('dev'), [])
+        storage.delete_record('p1', self.projects_file)
+        self.assertEqual(index.project_ids_led_by('lead'), [])
+
+    def test_persisted_index_is_reused_until_data_changes(self):
+        index = ProjectIndex(self.projects_file)
+        index.refresh()
+        index.persist()
+        reloaded = ProjectIndex(self.projects_file)
+        reloaded.rebuild = None  # must not be needed
+        self.assertEqual(reloaded.project_ids_led_by('lead'), ['p1'])
+        JsonBackend().save([], self.projects_file)
+        os.utime(self.projects_file, ns=(0, 0))
+        stale = ProjectIndex(self.projects_file)
+        self.assertIsNone(stale.project_id_by_title('Alpha'))
+
+class TestUserIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.users_file = os.path.join(self.tmp_dir.name, 'users.json')
+        storage.set_backend(JsonBackend())
+        storage.save_data([{'id': 'u1', 'username': 'ali', 'active': True}, {'username': 'legacy', 'active': True}], self.users_file)
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_lookups_follow_writes(self):
+        index = UserIndex(self.users_file)
+        self.assertEqual(index.user_id('ali'), 'u1')
+        self.assertEqual(index.user_id('legacy'), 'legacy')
+        storage.save_record({'id': 'u2', 'username': 'sara', 'active': True}, self.users_file)
+        self.assertEqual(index.user_id('sara'), 'u2')
+        storage.delete_record('u1', self.users_file)
+        self.assertIsNone(index.user_id('ali'))
+
+    def test_persisted_index_is_reused_until_data_changes(self):
+        index = UserIndex(self.users_file)
+        index.refresh()
+        index.persist()
+        reloaded = UserIndex(self.users_file)
+        reloaded.rebuild = None  # must not be needed
+        self.assertEqual(reloaded.user_id('ali'), 'u1')
+
+    def test_session_follows_changes_to_the_user(self):
+        user = session.start_session(dict(storage.get_record('u1', self.users_file)), self.users_file)
+        storage.update_record('u1', self.users_file, lambda user: user.update(active=False))
+        self.assertFalse(session.get_session_user('ali', self.users_file)['active'])
+        session.end_session(user['username'])
+        self.assertNotIn('ali', session._sessions)
+
+
+class TestExpiryScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        storage.set_backend(JsonBackend())
+        storage.save_data([
+            {'id': 'p1', 'title': 'Old', 'end_time': '2000-01-01T00:00:00', 'tasks': []},
+            {'id': 'p2', 'title': 'New', 'end_time': '2100-01-01T00:00:00',
+             'tasks': [{'id': 't1', 'end_time': '2050-01-01T00:00:00'}]},
+        ], self.projects_file)
+        self.expired_tasks = []
+        self.scheduler = ExpiryScheduler(
+            self.projects_file,
+            on_project_expired=lambda project, file_path: storage.delete_record(project['id'], file_path),
+            on_task_expired=lambda project, task, file_path: self.expired_tasks.append(task['id']))
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_only_due_entries_are_expired(self):
+        self.assertEqual(self.scheduler.run_due(), 1)
+        self.assertEqual([project['id'] for project in storage.load_data(self.projects_file)], ['p2'])
+        self.assertEqual(self.scheduler.run_due(now=4102444800), 2)
+        self.assertEqual(self.expired_tasks, ['t1'])
+
+    def test_nothing_is_read_until_an_entry_is_due(self):
+        self.scheduler.run_due()
+        get_record = storage.get_record
+        storage.get_record = None  # must not be needed
+        try:
+            self.assertEqual(self.scheduler.run_due(), 0)
+        finally:
+            storage.get_record = get_record
+
+    def test_changed_end_times_are_rescheduled(self):
+        self.scheduler.run_due()
+        storage.update_record('p2', self.projects_file, lambda project: project['tasks'][0].update(end_time='2000-01-02T00:00:00'))
+        self.assertEqual(self.scheduler.run_due(), 1)
+        self.assertEqual(self.expired_tasks, ['t1'])
+        self.assertEqual(self.scheduler.run_due(now=2524608000), 0)
+
+    def test_unreadable_end_times_are_skipped(self):
+        log_sink = log_to(self.tmp_dir.name)
+        self.addCleanup(restore_log, log_sink)
+        storage.save_record({'id': 'bad', 'title': 'Bad', 'end_time': 'next tuesday', 'tasks': []}, self.projects_file)
+        self.assertEqual(self.scheduler.run_due(), 1)
+        self.assertIsNone(storage.get_record('p1', self.projects_file))
+        self.assertIsNotNone(storage.get_record('bad', self.projects_file))
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_projects_are_read_back_one_by_one(self):
+        for number in range(3):
+            archive.archive_project({'id': f'p{number}', 'title': f'Project {number}', 'leader': 'ali', 'tasks': []}, 'deleted', 'ali', self.archive_dir)
+        self.assertEqual(archive.load_archived('p1', self.archive_dir)['title'], 'Project 1')
+        self.assertEqual([entry['id'] for entry in archive.find_archived('Project 2', archive_dir=self.archive_dir)], ['p2'])
+        # A segment is still one ordinary gzip JSONL file
+        segment = archive.segment_path(archive.read_index(self.archive_dir)['p0']['segment'], self.archive_dir)
+        with gzip.open(segment, 'rt') as file:
+            self.assertEqual([json.loads(line)['id'] for line in file], ['p0', 'p1', 'p2'])
+
+    def test_restored_projects_leave_the_index(self):
+        archive.archive_project({'id': 'p1', 'title': 'Old', 'leader': 'ali'}, 'expired', archive_dir=self.archive_dir)
+        archive.mark_restored('p1', self.archive_dir)
+        self.assertEqual(archive.find_archived(archive_dir=self.archive_dir), [])
+        self.assertIsNone(archive.load_archived('p1', self.archive_dir))
+
+
+    def test_comments_move_with_the_project(self):
+        comments_dir = os.path.join(self.tmp_dir.name, 'live', 'comments')
+        comments.append_comment('p1', 't1', {'username': 'ali', 'content': 'Keep me'}, comments_dir)
+        archive.archive_project({'id': 'p1', 'title': 'Board', 'leader': 'ali', 'tasks': [{'id': 't1'}]}, 'deleted', 'ali',
+                                self.archive_dir, comments_dir)
+        self.assertFalse(os.path.exists(os.path.join(comments_dir, 'p1')))
+        self.assertTrue(os.path.exists(os.path.join(self.archive_dir, 'comments', 'p1', 't1.jsonl')))
+        archive.mark_restored('p1', self.archive_dir, comments_dir)
+        self.assertEqual(comments.read_comments('p1', 't1', comments_dir=comments_dir)[0], [{'username': 'ali', 'content': 'Keep me'}])
+        self.assertEqual(archive.find_archived('Board', archive_dir=self.archive_dir), [])
+
+
+class TestModels(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        self.project = {
+            'id': 'p1', 'title': 'Board', 'leader': 'ali', 'members': ['ali', 'sara'],
+            'start_time': '2026-01-01T09:00:00', 'end_time': '2026-01-02T09:00:00', 'color': 'blue',
+            'tasks': [{'id': 't1', 'assigned_to': 'sara', 'priority': 'LOW', 'status': 'TODO',
+                       'comments': [{'username': 'ali', 'content': 'hi', 'timestamp': '2026-01-01T10:00:00'}]}],
+        }
+        storage.set_backend(JsonBackend())
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_round_trip_keeps_the_stored_form(self):
+        model = Project.from_dict(json.loads(json.dumps(self.project)))
+        self.assertEqual(model.to_dict(), self.project)
+        self.assertEqual(model.end_time.hour, 9)
+        self.assertIs(model['tasks'][0].status, Status.TODO)
+        self.assertEqual(model['tasks'][0]['status'], 'TODO')
+        self.assertEqual(model['color'], 'blue')
+
+    def test_storage_loads_models_and_writes_plain_json(self):
+        storage.save_data([self.project], self.projects_file)
+        storage.clear_cache()
+        project = storage.get_record('p1', self.projects_file)
+        self.assertIsInstance(project, Project)
+        project.setdefault('tasks', []).append({'id': 't2', 'status': 'DONE'})
+        storage.save_record(project, self.projects_file)
+        with open(self.projects_file) as file:
+            stored = json.load(file)[0]
+        self.assertEqual([task['id'] for task in stored['tasks']], ['t1', 't2'])
+        self.assertEqual(stored['end_time'], '2026-01-02T09:00:00')
+
+
+class TestTransactions(unittest.TestCase):
+
+    def setUp(self):
+        import operations
+        self.operations = operations
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        storage.set_backend(JsonBackend())
+        storage.save_data([{'id': 'u1', 'username': 'ali', 'active': True}], 'users.json')
+        storage.save_data([{'id': 'p1', 'title': 'Board', 'leader': 'ali', 'members': ['ali'],
+                            'tasks': [{'id': 't1', 'description': 'Old', 'details': '', 'assigned_to': 'ali',
+                                       'priority': 'LOW', 'status': 'TODO', 'comments': []}]}], 'projects.json')
+        self.events = []
+        self.record_events = operations.record_events
+        operations.record_events = self.events.append
+        self.log_sink = log_to(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.operations.record_events = self.record_events
+        # The shared indexes were made for the files in the temporary directory
+        forget_indexes()
+        restore_log(self.log_sink)
+        storage.set_backend(None)
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def stored_task(self):
+        with open('projects.json') as file:
+            return json.load(file)[0]['tasks'][0]
+
+    def test_edits_are_written_once_with_their_events(self):
+        writes = []
+        storage.add_observer('projects.json', lambda change, *args: writes.append(change))
+        self.operations.edit_task('ali', 'Board', 't1', 'New', 'More', 'high', 'doing')
+        task = self.stored_task()
+        self.assertEqual((task['description'], task['details'], task['priority'], task['status']), ('New', 'More', 'HIGH', 'DOING'))
+        self.assertEqual(writes.count('flush'), 1)
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual([event['action'] for event in self.events[0]], ['update_description', 'update_details', 'change_priority', 'change_status'])
+
+    def test_failure_rolls_back_changes_and_events(self):
+        with self.assertRaises(self.operations.OperationError):
+            with self.operations.transaction():
+                self.operations.update_task_description('ali', 'Board', 't1', 'New')
+                self.operations.change_task_status('ali', 'Board', 't1', 'bogus')
+        self.assertEqual(self.stored_task()['description'], 'Old')
+        self.assertEqual(storage.get_record('p1', 'projects.json')['tasks'][0]['description'], 'Old')
+        self.assertEqual(self.events, [])
+
+    def test_comments_are_appended_without_rewriting_the_project(self):
+        appended = []
+        append_comment = self.operations.append_comment
+        self.operations.append_comment = lambda project_id, task_id, comment: appended.append((project_id, task_id, comment['content']))
+        try:
+            stamp = storage.get_backend().stamp('projects.json')
+            self.operations.add_comment('ali', 'Board', 't1', 'Hello')
+        finally:
+            self.operations.append_comment = append_comment
+        self.assertEqual(appended, [('p1', 't1', 'Hello')])
+        self.assertEqual(storage.get_backend().stamp('projects.json'), stamp)
+
+    def test_comments_wait_for_the_transaction(self):
+        appended = []
+        append_comment = self.operations.append_comment
+        self.operations.append_comment = lambda project_id, task_id, comment: appended.append(comment['content'])
+        try:
+            with self.assertRaises(self.operations.OperationError):
+                with self.operations.transaction():
+                    self.operations.add_comment('ali', 'Board', 't1', 'Dropped')
+                    self.operations.change_task_status('ali', 'Board', 't1', 'bogus')
+            with self.operations.transaction():
+                self.operations.add_comment('ali', 'Board', 't1', 'Kept')
+                self.assertEqual(appended, [])
+        finally:
+            self.operations.append_comment = append_comment
+        self.assertEqual(appended, ['Kept'])
+
+    def test_events_are_stamped_when_written(self):
+        with self.operations.transaction():
+            self.operations.update_task_description('ali', 'Board', 't1', 'New')
+            # An event made long before the transaction ends
+            self.operations._pending_logs[0][1]['time'] = '2000-01-01T00:00:00'
+        self.assertGreater(self.events[0][0]['time'], datetime.now().isoformat()[:10])
+
+    def archive_calls(self):
+        calls = []
+        archived = {'id': 'p2', 'title': 'Old board', 'leader': 'ali', 'members': ['ali'], 'tasks': [], 'end_time': '2100-01-01T00:00:00'}
+        patches = [
+            mock.patch.object(self.operations, 'archive_project', lambda project, reason, actor=None: calls.append(('archive', project['id']))),
+            mock.patch.object(self.operations, 'mark_restored', lambda project_id: calls.append(('restored', project_id))),
+            mock.patch.object(self.operations, 'find_archived', lambda **criteria: [{'id': 'p2'}]),
+            mock.patch.object(self.operations, 'load_archived', lambda project_id: dict(archived)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return calls, archived
+
+    def test_archive_writes_wait_for_the_transaction(self):
+        calls, _ = self.archive_calls()
+        for operation, title in ((self.operations.delete_project, 'Board'), (self.operations.restore_project, 'Old board')):
+            with self.assertRaises(self.operations.OperationError):
+                with self.operations.transaction():
+                    operation('ali', title)
+                    self.assertEqual(calls, [])
+                    raise self.operations.OperationError("Refused later in the transaction")
+        self.assertEqual(calls, [])
+        self.assertIsNotNone(storage.get_record('p1', 'projects.json'))
+        self.assertIsNone(storage.get_record('p2', 'projects.json'))
+        self.operations.delete_project('ali', 'Board')
+        self.operations.restore_project('ali', 'Old board')
+        self.assertEqual(calls, [('archive', 'p1'), ('restored', 'p2')])
+
+    def test_unreadable_archived_end_time_is_refused(self):
+        _, archived = self.archive_calls()
+        archived['end_time'] = 'next tuesday'
+        with self.assertRaises(self.operations.OperationError):
+            self.operations.restore_project('ali', 'Old board')
+        self.assertIsNone(storage.get_record('p2', 'projects.json'))
+
+    def test_keyword_arguments_reach_the_operation_and_the_server(self):
+        hits = self.operations.query_tasks('ali', status='todo', project_title='Board')
+        self.assertEqual([hit['task'] for hit in hits], ['t1'])
+        self.assertEqual(self.operations.search_tasks('ali', 'old', limit=5)[0]['task'], 't1')
+        sent = []
+        server_url, run = api_client.SERVER_URL, api_client.run
+        api_client.SERVER_URL = 'http://127.0.0.1:1'
+        api_client.run = lambda command, *values: sent.append((command,) + values)
+        try:
+            self.operations.query_tasks('ali', status='todo', within='24')
+            self.operations.search_tasks('ali', 'old', limit=5)
+        finally:
+            api_client.SERVER_URL, api_client.run = server_url, run
+        self.assertEqual(sent, [('query-tasks', 'ali', None, None, 'todo', None, None, None, '24'),
+                                ('search', 'ali', 'old', 5)])
+
+    def test_my_tasks_are_grouped_by_status_and_ordered_by_urgency(self):
+        def add_tasks(project):
+            project['tasks'].extend([
+                {'id': 't2', 'description': 'Later', 'assigned_to': 'ali', 'priority': 'HIGH', 'status': 'TODO', 'end_time': '2026-02-01T00:00:00'},
+                {'id': 't3', 'description': 'Sooner', 'assigned_to': 'ali', 'priority': 'HIGH', 'status': 'TODO', 'end_time': '2026-01-01T00:00:00'},
+                {'id': 't4', 'description': 'Urgent', 'assigned_to': 'ali', 'priority': 'CRITICAL', 'status': 'TODO', 'end_time': '2026-03-01T00:00:00'},
+                {'id': 't5', 'description': 'Not mine', 'assigned_to': 'sara', 'priority': 'CRITICAL', 'status': 'TODO'},
+            ])
+        storage.update_record('p1', 'projects.json', add_tasks)
+        grouped = self.operations.my_tasks('ali')
+        self.assertEqual(list(grouped), ['BACKLOG', 'TODO', 'DOING', 'DONE', 'ARCHIVED'])
+        self.assertEqual([task['task'] for task in grouped['TODO']], ['t4', 't3', 't2', 't1'])
+        self.assertEqual([task['task'] for task in grouped['DOING']], [])
+
+
+class TestComments(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.task = {'id': 't1', 'comments': [{'username': 'ali', 'content': 'Inline', 'timestamp': '2026-01-01T00:00:00'}]}
+        for number in range(25):
+            comments.append_comment('p1', 't1', {'username': 'ali', 'content': f'Comment {number}', 'timestamp': '2026-01-02T00:00:00'},
+                                    self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_pages_are_newest_first(self):
+        read_block = comments.READ_BLOCK
+        # Blocks smaller than a line split lines across reads
+        comments.READ_BLOCK = 16
+        try:
+            first, more = comments.comment_page('p1', self.task, 0, 10, self.tmp_dir.name)
+            last, no_more = comments.comment_page('p1', self.task, 2, 10, self.tmp_dir.name)
+        finally:
+            comments.READ_BLOCK = read_block
+        self.assertEqual([comment['content'] for comment in first], [f'Comment {number}' for number in range(24, 14, -1)])
+        self.assertTrue(more)
+        # Comments stored in the task before the move come last
+        self.assertEqual([comment['content'] for comment in last], ['Comment 4', 'Comment 3', 'Comment 2', 'Comment 1', 'Comment 0', 'Inline'])
+        self.assertFalse(no_more)
+
+
+class TestDurability(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        self.durability = storage.DURABILITY
+
+    def tearDown(self):
+        storage.DURABILITY = self.durability
+        storage.sync()
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_failed_write_leaves_the_old_file(self):
+        storage.set_backend(JsonBackend())
+        storage.save_data([{'id': '1', 'title': 'First'}], self.projects_file)
+        with self.assertRaises(TypeError):
+            storage.save_data([{'id': '1', 'title': object()}], self.projects_file)
+        with open(self.projects_file) as file:
+            self.assertEqual(json.load(file)[0]['title'], 'First')
+        self.assertFalse(os.path.exists(self.projects_file + '.tmp'))
+
+    def test_batch_durability_syncs_once_at_the_end(self):
+        storage.DURABILITY = 'batch'
+        storage.set_backend(JsonBackend())
+        with storage.batch():
+            storage.save_record({'id': '1', 'title': 'First'}, self.projects_file)
+        self.assertEqual(storage._unsynced, set())
+        storage.DURABILITY = 'interval'
+        storage.save_record({'id': '2', 'title': 'Second'}, self.projects_file)
+        self.assertIn(self.projects_file, storage._unsynced)
+
+    def test_sqlite_batch_commits_once(self):
+        backend = SqliteBackend(os.path.join(self.tmp_dir.name, 'test.db'))
+        storage.set_backend(backend)
+        storage.save_data([], self.projects_file)
+        commits = []
+        backend._connect().set_trace_callback(lambda statement: commits.append(statement) if statement == 'COMMIT' else None)
+        with storage.batch():
+            for number in range(5):
+                storage.save_record({'id': str(number), 'title': f'Project {number}'}, self.projects_file)
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(len(backend.load(self.projects_file)), 5)
+        backend.close()
+
+
+class TestDirtyTracking(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        storage.set_backend(JsonBackend())
+        storage.save_data([{'id': '1', 'title': 'First', 'members': ['ali']}], self.projects_file)
+        self.writes = []
+        storage.add_observer(self.projects_file, lambda change, *args: self.writes.append(change))
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_unchanged_records_are_not_written(self):
+        before = storage.write_stats()
+        stamp = storage.get_backend().stamp(self.projects_file)
+        storage.update_record('1', self.projects_file, lambda project: project.update(title='First'))
+        storage.save_record({'id': '1', 'title': 'First', 'members': ['ali']}, self.projects_file)
+        storage.delete_record('missing', self.projects_file)
+        with storage.batch():
+            storage.update_record('1', self.projects_file, lambda project: project['members'].remove('nobody') if 'nobody' in project['members'] else None)
+        self.assertEqual(storage.get_backend().stamp(self.projects_file), stamp)
+        self.assertEqual(self.writes, [])
+        after = storage.write_stats()
+        self.assertEqual(after['skipped'] - before['skipped'], 4)
+        self.assertEqual(after['files'], before['files'])
+
+    def test_changed_records_are_still_written(self):
+        storage.update_record('1', self.projects_file, lambda project: project.update(title='Renamed'))
+        with open(self.projects_file) as file:
+            self.assertEqual(json.load(file)[0]['title'], 'Renamed')
+        self.assertEqual(self.writes, ['save'])
+
+
+
+class TestDataFormats(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        storage.set_backend(JsonBackend())
+        storage.save_data([{'id': '1', 'title': 'First', 'members': ['ali']}], self.projects_file)
+
+    def tearDown(self):
+        storage.DATA_FORMAT = 'json'
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_files_are_read_in_the_format_they_were_written(self):
+        for data_format in ('compact', 'orjson', 'json'):
+            storage.DATA_FORMAT = data_format
+            storage.update_record('1', self.projects_file, lambda project: project.update(title=data_format))
+            # A fresh backend has no cache, so the file itself is decoded
+            storage.set_backend(JsonBackend())
+            self.assertEqual(storage.get_record('1', self.projects_file)['title'], data_format)
+
+    def test_files_are_converted_on_their_next_change(self):
+        storage.DATA_FORMAT = 'compact'
+        with open(self.projects_file, 'rb') as file:
+            self.assertIn(b'\n', file.read())
+        storage.update_record('1', self.projects_file, lambda project: project.update(title='Renamed'))
+        with open(self.projects_file, 'rb') as file:
+            self.assertNotIn(b'\n', file.read())
+
+    def test_benchmark_reports_every_format(self):
+        results = storage.benchmark_formats([{'id': '1', 'tasks': []}], directory=self.tmp_dir.name)
+        self.assertEqual([result['format'] for result in results], list(storage.FORMATS))
+        for result in results:
+            if result['available']:
+                self.assertEqual(result['records'], 1)
+
+
+class TestStreamingReader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        storage.set_backend(JsonBackend())
+        # Brackets, quotes and escapes inside strings must not end a record early
+        self.projects = [{'id': str(i), 'title': f'Project "{i}" [x] {{y}} \\', 'leader': 'ali', 'members': ['ali'],
+                          'tasks': [{'id': f't{i}', 'description': ']}'}]} for i in range(5)]
+        with open(self.projects_file, 'w') as file:
+            json.dump(self.projects, file, indent=4)
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_records_are_streamed_one_by_one(self):
+        self.assertEqual([record.to_dict() for record in storage.iter_records(self.projects_file)], self.projects)
+        # Small chunks split records, strings and multi-byte characters
+        content = json.dumps(self.projects + [{'id': 'é', 'title': 'Café'}], ensure_ascii=False).encode('utf-8')
+        self.assertEqual(list(storage.scan_records(content, chunk_size=7)), self.projects + [{'id': 'é', 'title': 'Café'}])
+
+    def test_single_records_are_read_without_caching_the_file(self):
+        self.assertEqual(storage.get_record('3', self.projects_file, stream=True)['title'], self.projects[3]['title'])
+        self.assertEqual(storage.load_manifest(self.projects_file)[4], {
+            'id': '4', 'title': self.projects[4]['title'], 'leader': 'ali', 'members': ['ali'], 'tasks': [{'id': 't4'}]})
+        self.assertNotIn(self.projects_file, storage._cache)
+
+    def test_lookups_load_the_file_once(self):
+        storage.clear_cache()
+        for record_id in ('3', '1', '4'):
+            self.assertEqual(storage.get_record(record_id, self.projects_file)['id'], record_id)
+        self.assertEqual(storage.cache_stats(), {'hits': 2, 'misses': 1})
+
+    def test_truncated_file_is_an_error(self):
+        with open(self.projects_file, 'w') as file:
+            file.write('[{"id": "1", "title": "Cut')
+        with self.assertRaises(ValueError):
+            list(storage.iter_records(self.projects_file))
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        self.comments_dir = os.path.join(self.tmp_dir.name, 'comments')
+        storage.set_backend(JsonBackend())
+        storage.save_data([
+            {'id': 'p1', 'title': 'Site', 'leader': 'ali', 'members': ['ali'], 'tasks': [
+                {'id': 't1', 'description': 'Fix login bug', 'details': 'Crash on login', 'comments': []},
+                {'id': 't2', 'description': 'Write docs', 'details': 'Mention the login page', 'comments': []},
+            ]},
+            {'id': 'p2', 'title': 'Other', 'leader': 'sara', 'members': ['sara'], 'tasks': [
+                {'id': 't3', 'description': 'Login for sara', 'details': '', 'comments': []},
+            ]},
+        ], self.projects_file)
+        self.index = SearchIndex(self.projects_file, self.comments_dir)
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def hits(self, query, project_ids=('p1',)):
+        return [task_id for _, task_id in self.index.search(query, set(project_ids))]
+
+    def test_hits_are_ranked_and_limited_to_visible_projects(self):
+        # Words in the description weigh more than words in the details
+        self.assertEqual(self.hits('login'), ['t1', 't2'])
+        self.assertEqual(self.hits('LOGIN bug'), ['t1'])
+        self.assertEqual(self.hits('login', ('p1', 'p2'))[-1], 't2')
+        self.assertEqual(self.hits('nothing'), [])
+
+    def test_edits_and_comments_update_the_index(self):
+        self.hits('login')
+        storage.update_record('p1', self.projects_file, lambda project: project['tasks'][0].update(description='Polish header'))
+        comments.append_comment('p1', 't2', {'username': 'ali', 'content': 'Header colours'}, self.comments_dir)
+        self.assertEqual(self.hits('header'), ['t1', 't2'])
+        self.assertEqual(self.hits('bug'), [])
+        self.index.persist()
+        # A new session loads the saved tables and still follows new comments
+        index = SearchIndex(self.projects_file, self.comments_dir)
+        comments.append_comment('p1', 't2', {'username': 'ali', 'content': 'Footer too'}, self.comments_dir)
+        self.assertEqual([task_id for _, task_id in index.search('footer', {'p1'})], ['t2'])
+
+
+class TestTaskIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.projects_file = os.path.join(self.tmp_dir.name, 'projects.json')
+        storage.set_backend(JsonBackend())
+        tasks = [{'id': f't{number}', 'description': f'Task {number}', 'assigned_to': 'ali' if number < 2 else 'sara',
+                  'priority': 'HIGH' if number % 2 else 'LOW', 'status': 'DOING',
+                  'end_time': f'2026-01-{number + 1:02d}T12:00:00'} for number in range(10)]
+        storage.save_data([{'id': 'p1', 'title': 'Site', 'leader': 'ali', 'members': ['ali', 'sara'], 'tasks': tasks}], self.projects_file)
+        self.index = TaskIndex(self.projects_file)
+
+    def tearDown(self):
+        storage.set_backend(None)
+        self.tmp_dir.cleanup()
+
+    def test_planner_walks_the_most_selective_index(self):
+        criteria = {'assigned_to': {'ali'}, 'status': {'DOING'}, 'priority': {'HIGH', 'CRITICAL'}}
+        self.assertEqual(self.index.plan(criteria)[0], 'assigned_to')
+        self.assertEqual(self.index.query(criteria), ['t1'])
+        # Two days of end times is narrower than every HIGH task
+        due = (datetime(2026, 1, 3, 12).timestamp(), datetime(2026, 1, 4, 12).timestamp())
+        criteria = {'priority': {'HIGH'}, 'due': due}
+        self.assertEqual(self.index.plan(criteria)[0], 'end_time')
+        self.assertEqual(self.index.query(criteria), ['t3'])
+
+    def test_saved_tasks_are_reindexed(self):
+        self.index.query({'status': {'DOING'}})
+        storage.update_record('p1', self.projects_file, lambda project: project['tasks'][3].update(status='DONE', end_time='2025-12-01T00:00:00'))
+        self.assertEqual(self.index.query({'status': {'DONE'}}), ['t3'])
+        self.assertEqual(self.index.query({'due': (None, datetime(2026, 1, 1, 12).timestamp())}), ['t3', 't0'])
+
+if __name__ == '__main__':
+    unittest.main()